@@ -0,0 +1,125 @@
+"""Índices de busca por texto em SQLite FTS5.
+
+Cada `FtsIndex` é uma tabela virtual separada, com rowid = pk do modelo e
+tokenização `unicode61 remove_diacritics 2` (sem acento: "joao" acha
+"João"). A tabela só é criada e populada pelo comando rebuild_*_search do
+app (`create_table` + `rebuild`) e depois mantida pelos sinais; enquanto
+ela não existir (ou sem FTS5: outro banco ou SQLite sem o módulo)
+`available()` retorna False e o chamador usa o filtro tradicional.
+"""
+import logging
+import re
+from django.db import connection, DatabaseError
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(q):
+    """Termos digitados -> consulta FTS5 com prefixo em cada termo ("jo sil" -> "jo"* "sil"*)."""
+    return " ".join(f'"{t}"*' for t in _TOKEN.findall(q or ""))
+
+
+class FtsIndex:
+    def __init__(self, table, model_label, columns, weights, row):
+        self.table = table
+        self.model_label = model_label
+        self.columns = columns
+        self.weights = weights
+        self.row = row  # instância -> valores das colunas
+        self._available = None
+
+    @property
+    def model(self):
+        from django.apps import apps
+        return apps.get_model(self.model_label)
+
+    def available(self):
+        """True se a tabela do índice existe (o resultado positivo fica guardado no processo)."""
+        if self._available is not None:
+            return self._available
+        if connection.vendor != "sqlite":
+            self._available = False
+            return False
+        with connection.cursor() as cur:
+            cur.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [self.table])
+            if cur.fetchone():
+                self._available = True
+                return True
+        return False
+
+    def create_table(self):
+        """Cria a tabela virtual se faltar. Retorna False sem FTS5."""
+        if connection.vendor != "sqlite":
+            return False
+        if self.available():
+            return True
+        try:
+            with connection.cursor() as cur:
+                cur.execute(
+                    f"CREATE VIRTUAL TABLE {self.table} USING fts5({', '.join(self.columns)}, "
+                    "tokenize = 'unicode61 remove_diacritics 2')"
+                )
+                cur.execute(f"INSERT INTO {self.table} ({self.table}, rank) VALUES ('rank', %s)",
+                            [f"bm25({', '.join(str(w) for w in self.weights)})"])
+        except DatabaseError:
+            logger.warning("FTS5 indisponível para %s; usando icontains.", self.table)
+            return False
+        self._available = True
+        return True
+
+    @property
+    def _insert_sql(self):
+        marks = ", ".join(["%s"] * (len(self.columns) + 1))
+        return f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) VALUES ({marks})"
+
+    def index(self, obj):
+        if not self.available():
+            return
+        with connection.cursor() as cur:
+            cur.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [obj.pk])
+            cur.execute(self._insert_sql, [obj.pk, *self.row(obj)])
+
+    def unindex(self, pk):
+        if not self.available():
+            return
+        with connection.cursor() as cur:
+            cur.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [pk])
+
+    def rebuild(self, chunk_size=1000):
+        """Recria o conteúdo do índice a partir da tabela do modelo. Retorna o total indexado."""
+        total, lote = 0, []
+        with connection.cursor() as cur:
+            cur.execute(f"DELETE FROM {self.table}")
+            for obj in self.model.objects.order_by("pk").iterator(chunk_size=chunk_size):
+                lote.append([obj.pk, *self.row(obj)])
+                if len(lote) >= chunk_size:
+                    cur.executemany(self._insert_sql, lote)
+                    total, lote = total + len(lote), []
+            if lote:
+                cur.executemany(self._insert_sql, lote)
+                total += len(lote)
+        return total
+
+    def filter(self, qs, q):
+        """`qs` restrito ao texto `q` e anotado com `rank` (menor = mais relevante); None sem FTS5."""
+        if not self.available():
+            return None
+        expr = match_expression(q)
+        if not expr:
+            return qs.none()
+        qn = connection.ops.quote_name
+        outer = f"{qn(qs.model._meta.db_table)}.{qn(qs.model._meta.pk.column)}"
+        match = f"SELECT rowid AS id, rank FROM {self.table} WHERE {self.table} MATCH %s"
+        # A CTE materializada roda o MATCH uma vez por consulta; correlacionado direto
+        # (MATCH ... AND rowid = externo) repetiria a busca inteira a cada linha
+        materialized = "MATERIALIZED" if connection.Database.sqlite_version_info >= (3, 35) else ""
+        return qs.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [expr]),
+        ).annotate(rank=RawSQL(
+            f"WITH r AS {materialized} ({match}) SELECT r.rank FROM r WHERE r.id = {outer}", [expr],
+            output_field=FloatField(),
+        ))
@@ -0,0 +1,145 @@
+"""Paginação por cursor (keyset) para listas ordenadas por data de criação.
+
+Em vez de OFFSET, cada página busca as linhas "depois" da última exibida
+(`criado_em, id`), usando o índice das colunas de ordenação: o custo de uma
+página não cresce com a profundidade. Não há COUNT(*) por página; o total
+pode ser estimado opcionalmente (`keyset_estimate_count`).
+
+    class MinhaLista(KeysetPaginationMixin, ListView):
+        paginate_by = 25
+"""
+import base64
+from django.db import connections
+from django.db.models import Max, Min, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+
+
+def encode_cursor(criado_em, pk):
+    raw = f"{criado_em.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(value):
+    """Retorna (criado_em, id) ou None se o cursor for inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        data, pk = raw.rsplit("|", 1)
+        criado_em = parse_datetime(data)
+        return (criado_em, int(pk)) if criado_em else None
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def estimated_count(queryset):
+    """Total aproximado sem varrer a tabela; None quando não há estimativa barata.
+
+    PostgreSQL usa as estatísticas do planner; nos demais bancos a faixa de ids
+    (MIN/MAX, resolvidos pelo índice da PK) serve para consultas sem filtro.
+    """
+    if queryset.query.where:
+        return None
+    model = queryset.model
+    conn = connections[queryset.db]
+    if conn.vendor == "postgresql":
+        with conn.cursor() as cur:
+            cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+            row = cur.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    faixa = model._default_manager.using(queryset.db).aggregate(a=Min("pk"), b=Max("pk"))
+    if faixa["a"] is None:
+        return 0
+    return faixa["b"] - faixa["a"] + 1
+
+
+class KeysetPage:
+    """Página de resultados com links de cursor (compatível com `page_obj`)."""
+
+    def __init__(self, object_list, *, has_next, has_previous, params, cursor_key, count=None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self._params = params
+        self._cursor_key = cursor_key
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _query(self, **cursor):
+        params = {k: v for k, v in self._params.items() if k not in ("apos", "antes")}
+        params.update(cursor)
+        return "?" + urlencode(params)
+
+    @property
+    def next_query(self):
+        if not self._has_next:
+            return ""
+        return self._query(apos=encode_cursor(*self._cursor_key(self.object_list[-1])))
+
+    @property
+    def previous_query(self):
+        if not self._has_previous:
+            return ""
+        return self._query(antes=encode_cursor(*self._cursor_key(self.object_list[0])))
+
+    @property
+    def first_query(self):
+        return self._query()
+
+
+class KeysetPaginationMixin:
+    """Substitui a paginação por OFFSET do ListView por cursor em (`criado_em`, `id`) decrescente.
+
+    Parâmetros GET: `apos` (próxima página) e `antes` (página anterior). O
+    template recebe `page_obj` como `KeysetPage` e pode incluir
+    "portal/keyset_pagination.html".
+    """
+    keyset_field = "criado_em"
+    keyset_estimate_count = False
+
+    def _cursor_key(self, obj):
+        return getattr(obj, self.keyset_field), obj.pk
+
+    def paginate_queryset(self, queryset, page_size):
+        f = self.keyset_field
+        qs = queryset.order_by(f"-{f}", "-pk")
+        apos = decode_cursor(self.request.GET.get("apos", ""))
+        antes = decode_cursor(self.request.GET.get("antes", "")) if not apos else None
+
+        rows = None
+        if antes:
+            data, pk = antes
+            rows = list(
+                qs.filter(Q(**{f"{f}__gt": data}) | Q(**{f: data, "pk__gt": pk}))
+                .order_by(f, "pk")[:page_size + 1]
+            )
+            has_previous = len(rows) > page_size
+            rows = rows[:page_size][::-1] or None  # nada mais novo: volta ao início
+            has_next = True
+        if rows is None:
+            if apos:
+                data, pk = apos
+                qs = qs.filter(Q(**{f"{f}__lt": data}) | Q(**{f: data, "pk__lt": pk}))
+            rows = list(qs[:page_size + 1])
+            has_next = len(rows) > page_size
+            rows = rows[:page_size]
+            has_previous = bool(apos)
+
+        count = estimated_count(queryset) if self.keyset_estimate_count else None
+        page = KeysetPage(rows, has_next=has_next, has_previous=has_previous,
+                          params=self.request.GET.dict(), cursor_key=self._cursor_key, count=count)
+        return (None, page, rows, page.has_other_pages())
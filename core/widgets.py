@@ -0,0 +1,58 @@
+"""Widgets de formulário compartilhados.
+
+`Autocomplete` substitui o <select> de ModelChoiceField em cadastros grandes
+(produtos, clientes): renderiza só o valor escolhido (id oculto + texto) e
+busca as opções por AJAX num endpoint JSON indexado. O campo continua um
+ModelChoiceField comum, que valida apenas o id enviado (`queryset.get(pk=...)`).
+O JS fica em portal/widgets/autocomplete_js.html, incluído pelo base.html.
+"""
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+
+class Autocomplete(forms.Select):
+    template_name = "portal/widgets/autocomplete.html"
+
+    def __init__(self, url, *, label="{nome}", hint="", min_chars=1, attrs=None):
+        super().__init__(attrs)
+        self.url = url          # nome da rota JSON ({"results": [...]}, parâmetro ?q=)
+        self.label = label      # modelo do texto exibido, com campos do resultado: "{sku} - {nome}"
+        self.hint = hint        # texto secundário na lista de opções
+        self.min_chars = min_chars
+        self.selected = None    # (pk, texto) já conhecido, evita consulta ao renderizar
+
+    def format_value(self, value):
+        if value is None or value == "":
+            return ""
+        return str(value)
+
+    def use_required_attribute(self, initial):
+        # Select olha a primeira opção (o que pode carregar o queryset inteiro)
+        return not self.is_hidden
+
+    def selected_label(self, value):
+        if not value:
+            return ""
+        if self.selected and str(self.selected[0]) == value:
+            return self.selected[1]
+        field = getattr(self.choices, "field", None)
+        if field is None:
+            return ""
+        try:
+            obj = field.queryset.filter(pk=value).first()
+        except (ValueError, TypeError, ValidationError):
+            return ""
+        return field.label_from_instance(obj) if obj else ""
+
+    def get_context(self, name, value, attrs):
+        # Widget.get_context (e não ChoiceWidget): não percorre as opções
+        context = forms.Widget.get_context(self, name, value, attrs)
+        context["widget"].update({
+            "label": self.selected_label(context["widget"]["value"]),
+            "url": reverse(self.url),
+            "label_template": self.label,
+            "hint_template": self.hint,
+            "min_chars": self.min_chars,
+        })
+        return context
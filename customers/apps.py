@@ -3,3 +3,10 @@ from django.apps import AppConfig
 class CustomersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "customers"
+
+    def ready(self):
+        # Índice de busca (FTS5)
+        try:
+            from . import signals  # noqa: F401
+        except Exception:
+            pass
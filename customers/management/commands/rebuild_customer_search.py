@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from customers import search
+
+class Command(BaseCommand):
+    help = "Reconstrói o índice de busca de clientes (SQLite FTS5)."
+
+    def handle(self, *args, **options):
+        if not search.index.create_table():
+            self.stdout.write(self.style.WARNING("FTS5 indisponível neste banco; a busca usa icontains."))
+            return
+        n = search.index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{n} clientes indexados."))
@@ -0,0 +1,49 @@
+"""Busca de clientes por texto (SQLite FTS5, ver core/fts.py).
+
+O índice guarda nome, razão social, e-mail e documento (também só com
+dígitos) de cada cliente; é criado e reconstruído pelo comando
+rebuild_customer_search e mantido pelos sinais de Customer. Sem o índice
+(ou sem FTS5) a busca volta aos filtros icontains.
+"""
+import re
+from django.db.models import Q
+from core.fts import FtsIndex
+from customers.models import Customer
+
+
+def _digits(value):
+    return re.sub(r"\D", "", value or "")
+
+
+index = FtsIndex(
+    "customers_customer_fts", "customers.Customer",
+    columns=["nome", "razao_social", "email", "cpf_cnpj", "documento"],
+    weights=[10.0, 5.0, 2.0, 3.0, 3.0],
+    row=lambda c: [c.nome or "", c.razao_social or "", c.email or "", c.cpf_cnpj or "", _digits(c.cpf_cnpj)],
+)
+
+
+def search_customers(qs, q):
+    """Filtra `qs` pelo texto `q`, ordenando pela relevância quando há FTS5."""
+    q = (q or "").strip()
+    if not q:
+        return qs
+    ranked = index.filter(qs, q)
+    if ranked is not None:
+        return ranked.order_by("rank", "nome")
+    return qs.filter(
+        Q(nome__icontains=q) | Q(razao_social__icontains=q) | Q(email__icontains=q) | Q(cpf_cnpj__icontains=q)
+    )
+
+
+TYPEAHEAD_FIELDS = ("id", "nome", "razao_social", "cpf_cnpj")
+
+
+def typeahead(q, limit=10):
+    """Até `limit` clientes ativos para o texto digitado (lista de dicts)."""
+    if not (q or "").strip():
+        return []
+    qs = search_customers(Customer.objects.filter(ativo=True), q)
+    if not qs.query.order_by:
+        qs = qs.order_by("nome")
+    return list(qs.values(*TYPEAHEAD_FIELDS)[:limit])
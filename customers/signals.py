@@ -0,0 +1,21 @@
+import logging
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from customers.models import Customer
+from customers import search
+
+logger = logging.getLogger(__name__)
+
+@receiver(post_save, sender=Customer, dispatch_uid="customers_search_index")
+def _customer_indexed(sender, instance, raw=False, **kwargs):
+    try:
+        search.index.index(instance)
+    except Exception:
+        logger.exception("Falha ao indexar cliente #%s; rode rebuild_customer_search", instance.pk)
+
+@receiver(post_delete, sender=Customer, dispatch_uid="customers_search_unindex")
+def _customer_unindexed(sender, instance, **kwargs):
+    try:
+        search.index.unindex(instance.pk)
+    except Exception:
+        logger.exception("Falha ao remover cliente #%s do índice de busca", instance.pk)
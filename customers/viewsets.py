@@ -4,11 +4,19 @@ from .models import Customer
 from .serializers import CustomerSerializer
 from core.permissions import IsStaffOrReadOnly
 
+class CustomerSearchFilter(filters.SearchFilter):
+    """?search= pelo índice FTS5 (ordenado por relevância), com fallback icontains."""
+
+    def filter_queryset(self, request, queryset, view):
+        from .search import search_customers
+        termos = self.get_search_terms(request)
+        return search_customers(queryset, " ".join(termos)) if termos else queryset
+
 class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.objects.all().order_by("-criado_em")
     serializer_class = CustomerSerializer
     permission_classes = [IsStaffOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, CustomerSearchFilter, filters.OrderingFilter]
     filterset_fields = ["ativo", "tipo", "cidade", "uf"]
     search_fields = ["nome", "razao_social", "cpf_cnpj", "email"]
     ordering_fields = ["criado_em", "atualizado_em", "nome"]
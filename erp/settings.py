@@ -95,6 +95,12 @@ DATABASES = {
     }
 }
 
+# ---- Cache ----
+# Padrão LocMem: um cache por processo. Para que comandos de manutenção e
+# outros processos invalidem o cache do servidor, aponte CACHE_URL para um
+# backend compartilhado (ex.: filecache:///caminho/cache, redis://...).
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
 # Password validators
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -131,6 +137,9 @@ LOGOUT_REDIRECT_URL = "/"
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # expira ao fechar o navegador
 
+# Estoque: mantém camadas FIFO (CostLayer) além do custo médio ponderado
+INVENTORY_FIFO_LAYERS = env.bool("INVENTORY_FIFO_LAYERS", default=False)
+
 # DRF + Spectacular
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
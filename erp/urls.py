@@ -6,7 +6,7 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 from customers.viewsets import CustomerViewSet
 from products.viewsets import ProductViewSet
-from sales.viewsets import SalesOrderViewSet, SalesOrderItemViewSet
+from sales.viewsets import SalesOrderViewSet, SalesOrderItemViewSet, QuoteViewSet, SalesReportViewSet
 from rental.viewsets import ReservationViewSet
 from finance.viewsets import LedgerEntryViewSet
 from fiscal.viewsets import FiscalDocumentViewSet
@@ -17,6 +17,8 @@ router.register(r"customers", CustomerViewSet)
 router.register(r"products", ProductViewSet)
 router.register(r"sales-orders", SalesOrderViewSet)
 router.register(r"sales-order-items", SalesOrderItemViewSet)
+router.register(r"quotes", QuoteViewSet)
+router.register(r"sales-report", SalesReportViewSet, basename="sales-report")
 router.register(r"reservations", ReservationViewSet)
 router.register(r"ledger", LedgerEntryViewSet)
 router.register(r"fiscal-docs", FiscalDocumentViewSet)
@@ -0,0 +1,88 @@
+"""Registro em memória de contas e formas de pagamento.
+
+Os cadastros são pequenos e lidos em quase toda tela do financeiro: ficam
+no cache do Django (CACHES) sob um número de versão, e cada processo guarda
+a última versão lida, indexada por id e por nome.
+Uma consulta ao registro custa uma leitura da versão no cache; o banco só é
+lido quando a versão muda. Os sinais de Account e PaymentMethod incrementam
+a versão a cada criação, alteração ou exclusão (após o commit).
+Com o LocMem padrão a versão é por processo: alterações feitas em outro
+processo (comandos, shell) só aparecem após reiniciar o servidor, a menos
+que CACHE_URL aponte para um cache compartilhado (erp/settings.py).
+Os dicts devolvidos são compartilhados: somente leitura.
+"""
+from django.core.cache import cache
+from .models import Account, PaymentMethod
+
+CACHE_VERSION_KEY = "finance:accounts:version"
+CACHE_TTL = 3600
+FIELDS = ("id", "nome", "tipo", "ativo", "created_at")
+
+
+class _Registry:
+    def __init__(self, version, accounts, payment_methods):
+        self.version = version
+        self.accounts = accounts                # todas, em ordem de id
+        self.payment_methods = payment_methods  # todas, em ordem de nome
+        self.account_by_id = {a["id"]: a for a in accounts}
+        self.account_by_name = {}
+        for a in accounts:
+            # Nomes repetidos: vale a conta mais antiga (mesma regra do backfill)
+            self.account_by_name.setdefault(a["nome"], a)
+        self.payment_method_by_name = {p["nome"]: p for p in payment_methods}
+
+
+_current = None  # último registro lido por este processo
+
+
+def _cache_version():
+    return cache.get_or_set(CACHE_VERSION_KEY, 1, None)
+
+
+def invalidate_cache():
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, 1, None)
+
+
+def registry():
+    global _current
+    version = _cache_version()
+    reg = _current
+    if reg is not None and reg.version == version:
+        return reg
+    key = f"finance:accounts:{version}"
+    data = cache.get(key)
+    if data is None:
+        data = (
+            list(Account.objects.order_by("id").values(*FIELDS)),
+            list(PaymentMethod.objects.order_by("nome").values(*FIELDS)),
+        )
+        cache.set(key, data, CACHE_TTL)
+    _current = _Registry(version, *data)
+    return _current
+
+
+def active_accounts():
+    return [a for a in registry().accounts if a["ativo"]]
+
+
+def active_payment_methods():
+    return [p for p in registry().payment_methods if p["ativo"]]
+
+
+def get_account(account_id):
+    """Conta (dict) pelo id, ou None."""
+    try:
+        return registry().account_by_id.get(int(account_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_account_by_name(nome):
+    return registry().account_by_name.get(nome)
+
+
+def get_payment_method_by_name(nome):
+    return registry().payment_method_by_name.get(nome)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class FinanceConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "finance"
+
+    def ready(self):
+        # Saldos por conta e caches de categorias/contas
+        from . import signals  # noqa: F401
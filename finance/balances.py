@@ -0,0 +1,82 @@
+"""Saldos materializados por conta (AccountBalance).
+
+Cada lançamento pago soma seu valor em `entradas` (CR) ou `saidas` (CP) da
+linha da sua conta (LedgerEntry.account). Os sinais de LedgerEntry aplicam a
+diferença entre o estado anterior e o novo com UPDATE por F(), dentro da
+transação do save (ver LedgerEntry.save); `rebuild_balances` refaz a tabela
+a partir dos lançamentos.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.utils import timezone
+from .models import AccountBalance, LedgerEntry
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Decimal("0.00")
+CENT = Decimal("0.01")
+
+
+def entry_snapshot(account_id, tipo, valor, pago_em):
+    """(account_id, coluna, valor) do que o lançamento soma no saldo, ou None se não soma."""
+    if pago_em is None or not account_id or tipo not in ("CR", "CP"):
+        return None
+    return (account_id, "entradas" if tipo == "CR" else "saidas", Decimal(valor or 0).quantize(CENT))
+
+
+def _apply(account_id, entradas, saidas):
+    updated = AccountBalance.objects.filter(account_id=account_id).update(
+        entradas=F("entradas") + Value(entradas, output_field=MONEY),
+        saidas=F("saidas") + Value(saidas, output_field=MONEY),
+        atualizado_em=timezone.now(),
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            AccountBalance.objects.create(account_id=account_id, entradas=entradas, saidas=saidas)
+    except IntegrityError:
+        # Criada por outra transação entre o UPDATE e o INSERT
+        _apply(account_id, entradas, saidas)
+
+
+def apply_entry_change(old, new):
+    """`old`/`new` são snapshots (entry_snapshot) antes e depois da alteração."""
+    if old == new:
+        return
+    deltas = defaultdict(lambda: {"entradas": ZERO, "saidas": ZERO})
+    for snap, sign in ((old, -1), (new, 1)):
+        if snap:
+            deltas[snap[0]][snap[1]] += sign * snap[2]
+    for account_id, d in deltas.items():
+        if d["entradas"] or d["saidas"]:
+            _apply(account_id, d["entradas"], d["saidas"])
+
+
+def balances_for(account_ids):
+    """{conta_id: {"in", "out", "balance"}} lidos de AccountBalance (Decimal; zero se não houver linha)."""
+    rows = {b.account_id: b for b in AccountBalance.objects.filter(account_id__in=set(account_ids))}
+    res = {}
+    for account_id in account_ids:
+        b = rows.get(account_id)
+        total_in = b.entradas if b else ZERO
+        total_out = b.saidas if b else ZERO
+        res[account_id] = {"in": total_in, "out": total_out, "balance": total_in - total_out}
+    return res
+
+
+@transaction.atomic
+def rebuild_balances():
+    """Refaz AccountBalance a partir dos lançamentos pagos. Retorna o número de contas."""
+    totals = defaultdict(lambda: {"entradas": ZERO, "saidas": ZERO})
+    rows = (LedgerEntry.objects
+            .filter(pago_em__isnull=False, account__isnull=False, tipo__in=("CR", "CP"))
+            .values("account_id", "tipo")
+            .annotate(total=Sum("valor"))
+            .order_by())
+    for r in rows:
+        totals[r["account_id"]]["entradas" if r["tipo"] == "CR" else "saidas"] += Decimal(r["total"] or 0).quantize(CENT)
+    AccountBalance.objects.all().delete()
+    AccountBalance.objects.bulk_create([AccountBalance(account_id=a, **t) for a, t in totals.items()])
+    return len(totals)
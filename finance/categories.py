@@ -0,0 +1,41 @@
+"""Opções de categoria (ExpenseCategory) compartilhadas entre formulários.
+
+A árvore inteira é lida uma vez com select_related('parent') e guardada no
+cache do Django sob uma versão; todos os ExpenseCategoryChoiceField (de
+todos os formulários e linhas de formset) usam a mesma lista. Os sinais de
+ExpenseCategory incrementam a versão, e a próxima leitura recarrega.
+Com o LocMem padrão o cache é por processo: alterações feitas em outro
+processo aparecem em até CACHE_TTL (ou na hora, com CACHE_URL compartilhado).
+"""
+from django.core.cache import cache
+from .models import ExpenseCategory
+
+CACHE_VERSION_KEY = "finance:categories:version"
+CACHE_TTL = 3600
+
+
+def category_label(cat):
+    if cat.parent_id:
+        return f"{cat.parent.name}/{cat.name}"
+    return cat.name
+
+
+def _cache_version():
+    return cache.get_or_set(CACHE_VERSION_KEY, 1, None)
+
+
+def invalidate_cache():
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, 1, None)
+
+
+def category_choices():
+    """[(pk, rótulo)] de todas as categorias, na ordem do cadastro."""
+    key = f"finance:categories:{_cache_version()}"
+    choices = cache.get(key)
+    if choices is None:
+        choices = [(c.pk, category_label(c)) for c in ExpenseCategory.objects.select_related("parent").order_by("pk")]
+        cache.set(key, choices, CACHE_TTL)
+    return choices
@@ -1,16 +1,46 @@
 from django import forms
+from django.forms.models import ModelChoiceIterator, ModelChoiceIteratorValue
 from django.utils import timezone
 from .models import ExpenseCategory
 from . import services
+from .categories import category_choices, category_label
 
 TIPO_CHOICES = (("CR","Conta a Receber"),("CP","Conta a Pagar"))
 
 
+class _CachedCategoryIterator(ModelChoiceIterator):
+    # Opções vindas de finance.categories (cache versionado), não do queryset
+    def __init__(self, field):
+        super().__init__(field)
+        self._choices = None
+
+    def _cached(self):
+        if self._choices is None:
+            self._choices = category_choices()
+        return self._choices
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for pk, label in self._cached():
+            yield (ModelChoiceIteratorValue(pk, None), label)
+
+    def __len__(self):
+        return len(self._cached()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self._cached())
+
+
 class ExpenseCategoryChoiceField(forms.ModelChoiceField):
+    """Opções do cache compartilhado de categorias; a validação busca só o id enviado."""
+    iterator = _CachedCategoryIterator
+
+    def __init__(self, queryset, **kwargs):
+        super().__init__(queryset.select_related("parent"), **kwargs)
+
     def label_from_instance(self, obj):
-        if getattr(obj, 'parent', None):
-            return f"{obj.parent.name}/{obj.name}"
-        return obj.name
+        return category_label(obj)
 
 
 class GerarTituloForm(forms.Form):
@@ -41,7 +71,7 @@ def _account_choices():
         items = services.list_accounts()
         out = [('', '— selecione —')]
         for a in items:
-            out.append((str(a.get('id')), a.get('nome','')))
+            out.append((str(a.get('id')), f"{a.get('nome','')} ({a.get('tipo','')})"))
         return out
     except Exception:
         return [('', '— selecione —')]
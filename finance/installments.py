@@ -0,0 +1,117 @@
+"""Parcelamento de documentos financeiros (CR/CP).
+
+`schedule` calcula as parcelas em memória: o valor é dividido em centavos e
+os centavos que sobram do arredondamento vão, um a um, para as primeiras
+parcelas (100,00 em 3 = 33,34 + 33,33 + 33,33), de modo que a soma sempre
+bate com o total. Os vencimentos seguem o intervalo em dias ou,
+opcionalmente, o calendário mensal, com ajuste para o fim do mês e para
+dias úteis.
+
+`build_entries` transforma o cronograma em LedgerEntry (sem gravar) e
+`create_installments` grava tudo com um único bulk_create. As parcelas
+nascem em aberto (sem pago_em), por isso não afetam AccountBalance.
+"""
+import calendar
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+from django.utils import timezone
+from .models import LedgerEntry
+
+CENT = Decimal("0.01")
+
+
+@dataclass(frozen=True)
+class Parcela:
+    numero: int
+    total: int
+    valor: Decimal
+    vencimento: date
+
+
+def to_cents(valor):
+    return Decimal(str(valor or 0)).quantize(CENT, ROUND_HALF_UP)
+
+
+def split_amount(total, parcelas):
+    """Divide `total` em `parcelas` valores de centavos; a sobra vai um centavo por parcela, do início."""
+    total = to_cents(total)
+    parcelas = max(int(parcelas or 1), 1)
+    base = (total / parcelas).quantize(CENT, ROUND_DOWN)
+    sobra = int((total - base * parcelas) / CENT)  # mesmo sinal do total, |sobra| < parcelas
+    passo = CENT if sobra > 0 else -CENT
+    return [base + passo if i < abs(sobra) else base for i in range(parcelas)]
+
+
+def _add_months(d, months, day):
+    ano, mes = divmod(d.month - 1 + months, 12)
+    ano, mes = d.year + ano, mes + 1
+    return date(ano, mes, min(day, calendar.monthrange(ano, mes)[1]))
+
+
+def _month_end(d):
+    return date(d.year, d.month, calendar.monthrange(d.year, d.month)[1])
+
+
+def next_business_day(d, feriados=()):
+    """`d` ou o próximo dia útil (seg-sex, fora de `feriados`)."""
+    while d.weekday() >= 5 or d in feriados:
+        d += timedelta(days=1)
+    return d
+
+
+def due_dates(parcelas, primeiro_vencimento=None, intervalo_dias=30, *, mensal=False, fim_de_mes=False,
+              dias_uteis=False, feriados=()):
+    """Vencimentos das parcelas.
+
+    - padrão: a cada `intervalo_dias` a partir do primeiro vencimento;
+    - mensal: mesmo dia nos meses seguintes (31/01 -> 28/02 -> 31/03);
+    - fim_de_mes: cada vencimento vai para o último dia do seu mês;
+    - dias_uteis: sábados, domingos e `feriados` passam para o próximo dia útil.
+    """
+    primeiro = primeiro_vencimento or timezone.localdate()
+    parcelas = max(int(parcelas or 1), 1)
+    intervalo = int(intervalo_dias or 30)
+    datas = []
+    for i in range(parcelas):
+        if mensal or fim_de_mes:
+            d = _add_months(primeiro, i, primeiro.day)
+        else:
+            d = primeiro + timedelta(days=intervalo * i)
+        if fim_de_mes:
+            d = _month_end(d)
+        if dias_uteis:
+            d = next_business_day(d, feriados)
+        datas.append(d)
+    return datas
+
+
+def schedule(total, parcelas, primeiro_vencimento=None, intervalo_dias=30, **regras):
+    """Cronograma [Parcela] de `total` em `parcelas` (regras de data: ver due_dates)."""
+    valores = split_amount(total, parcelas)
+    datas = due_dates(len(valores), primeiro_vencimento, intervalo_dias, **regras)
+    return [Parcela(i, len(valores), v, d) for i, (v, d) in enumerate(zip(valores, datas), start=1)]
+
+
+def build_entries(doc, cronograma, *, descricao=None, **campos):
+    """LedgerEntry (não gravados) do documento, um por parcela; `campos` vão para todos."""
+    descricao = descricao or doc.descricao
+    return [
+        LedgerEntry(
+            documento=doc,
+            tipo=doc.tipo,
+            descricao=f"{descricao} ({p.numero}/{p.total})",
+            valor=p.valor,
+            vencimento=p.vencimento,
+            pago_em=None,
+            **campos,
+        )
+        for p in cronograma
+    ]
+
+
+def create_installments(doc, *, parcelas, primeiro_vencimento=None, intervalo_dias=30, descricao=None,
+                        regras=None, **campos):
+    """Gera e grava (um bulk_create) as parcelas de `doc` sobre doc.valor_total."""
+    cronograma = schedule(doc.valor_total, parcelas, primeiro_vencimento, intervalo_dias, **(regras or {}))
+    return LedgerEntry.objects.bulk_create(build_entries(doc, cronograma, descricao=descricao, **campos))
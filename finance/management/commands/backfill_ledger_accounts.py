@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from finance.balances import rebuild_balances
+from finance.models import Account, AccountBalance, LedgerEntry, PaymentMethod
+
+
+def _columns(table):
+    with connection.cursor() as cur:
+        return {c.name for c in connection.introspection.get_table_description(cur, table)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Prepara bancos antigos para as contas com FK: cria o que faltar (colunas/tabelas que o "
+        "migrate --run-syncdb não altera), preenche LedgerEntry.account casando meio_pagamento com "
+        "o nome da conta e reconstrói os saldos."
+    )
+
+    def _ensure_schema(self):
+        tables = set(connection.introspection.table_names())
+        with connection.schema_editor() as editor:
+            for model in (Account, PaymentMethod):
+                if model._meta.db_table not in tables:
+                    editor.create_model(model)
+                    self.stdout.write(f"Tabela criada: {model._meta.db_table}")
+            entry_table = LedgerEntry._meta.db_table
+            if "account_id" not in _columns(entry_table):
+                editor.add_field(LedgerEntry, LedgerEntry._meta.get_field("account"))
+                self.stdout.write(f"Coluna criada: {entry_table}.account_id")
+            with connection.cursor() as cur:
+                existentes = set(connection.introspection.get_constraints(cur, entry_table))
+            for index in LedgerEntry._meta.indexes:
+                if index.name not in existentes:
+                    editor.add_index(LedgerEntry, index)
+                    self.stdout.write(f"Índice criado: {index.name}")
+            # Saldos são derivados: tabela no formato antigo (por nome) é recriada
+            balance_table = AccountBalance._meta.db_table
+            if balance_table in tables and "account_id" not in _columns(balance_table):
+                editor.delete_model(AccountBalance)
+                tables.discard(balance_table)
+            if balance_table not in tables:
+                editor.create_model(AccountBalance)
+                self.stdout.write(f"Tabela criada: {balance_table}")
+
+    def handle(self, *args, **options):
+        self._ensure_schema()
+        total = 0
+        with transaction.atomic():
+            # Nomes repetidos: vale a conta mais antiga (account__isnull evita sobrescrever)
+            for conta in Account.objects.order_by("id"):
+                n = LedgerEntry.objects.filter(account__isnull=True, meio_pagamento=conta.nome).update(account=conta)
+                if n:
+                    self.stdout.write(f"{conta.nome}: {n} lançamentos")
+                total += n
+        sem_conta = LedgerEntry.objects.filter(account__isnull=True, pago_em__isnull=False).count()
+        contas = rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} lançamentos vinculados; {sem_conta} pagos sem conta; saldos de {contas} contas reconstruídos."
+        ))
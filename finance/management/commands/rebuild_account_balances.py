@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from finance.balances import rebuild_balances
+
+class Command(BaseCommand):
+    help = "Reconstrói os saldos materializados das contas (AccountBalance) a partir dos lançamentos pagos."
+
+    def handle(self, *args, **options):
+        n = rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(f"Saldos reconstruídos: {n} contas."))
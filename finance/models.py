@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from customers.models import Customer
@@ -33,6 +33,38 @@ class FinanceDocument(models.Model):
         qs = self.lancamentos.all()
         return qs.exists() and all(l.pago_em for l in qs)
 
+class Account(models.Model):
+    """Conta de caixa/banco (tabela finance_account, antes criada por SQL em services)."""
+    nome = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=30)
+    ativo = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "finance_account"
+        verbose_name = "Conta"
+        verbose_name_plural = "Contas"
+
+    def __str__(self):
+        return self.nome
+
+
+class PaymentMethod(models.Model):
+    """Forma de pagamento (tabela finance_paymentmethod, antes criada por SQL em services)."""
+    nome = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=30, blank=True)
+    ativo = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "finance_paymentmethod"
+        verbose_name = "Forma de Pagamento"
+        verbose_name_plural = "Formas de Pagamento"
+
+    def __str__(self):
+        return self.nome
+
+
 class LedgerEntry(models.Model):
     TIPO = (("CR","Conta a Receber"),("CP","Conta a Pagar"))
     documento = models.ForeignKey(FinanceDocument, null=True, blank=True, related_name="lancamentos", on_delete=models.CASCADE)
@@ -43,6 +75,8 @@ class LedgerEntry(models.Model):
     vencimento = models.DateField()
     pago_em = models.DateField(null=True, blank=True)
     meio_pagamento = models.CharField(max_length=30, blank=True)  # Pix, Boleto, Cartão...
+    # Conta da baixa; indexada junto com pago_em (fin_entry_account_pago_idx)
+    account = models.ForeignKey(Account, null=True, blank=True, related_name="lancamentos", on_delete=models.PROTECT, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -50,14 +84,63 @@ class LedgerEntry(models.Model):
     expense_category_parent = models.ForeignKey('ExpenseCategory', null=True, blank=True, related_name='+', on_delete=models.PROTECT)
     expense_category = models.ForeignKey('ExpenseCategory', null=True, blank=True, related_name='ledger_entries', on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            # Casamento legado por nome da conta (backfill_ledger_accounts)
+            models.Index(fields=["meio_pagamento", "tipo", "pago_em"], name="fin_entry_meio_tipo_pago_idx"),
+            # Extrato e saldo por conta, por período
+            models.Index(fields=["account", "pago_em"], name="fin_entry_account_pago_idx"),
+        ]
+
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.descricao} ({self.valor})"
 
+    # O saldo materializado (AccountBalance) é ajustado pelos sinais, na mesma transação
+    def save(self, *args, **kwargs):
+        if self.account_id is None and self.meio_pagamento:
+            # API e telas antigas só informam o nome da conta em meio_pagamento
+            from .accounts import get_account_by_name
+            conta = get_account_by_name(self.meio_pagamento)
+            if conta:
+                self.account_id = conta["id"]
+                update_fields = kwargs.get("update_fields")
+                if update_fields is not None and "account" not in update_fields:
+                    kwargs["update_fields"] = [*update_fields, "account"]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     @property
     def em_aberto(self):
         return self.pago_em is None
 
 
+class AccountBalance(models.Model):
+    """Totais pagos acumulados por conta (LedgerEntry.account).
+
+    Mantido por finance.balances a cada save/delete de lançamento;
+    reconstruído pelo comando rebuild_account_balances.
+    """
+    account = models.OneToOneField(Account, related_name="saldo", on_delete=models.CASCADE)
+    entradas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    saidas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Saldo de Conta"
+        verbose_name_plural = "Saldos de Conta"
+
+    def __str__(self):
+        return f"{self.account_id}: {self.entradas - self.saidas}"
+
+    @property
+    def saldo(self):
+        return self.entradas - self.saidas
+
+
 class ExpenseCategory(models.Model):
     name = models.CharField(max_length=80)
     parent = models.ForeignKey('self', null=True, blank=True, related_name='children', on_delete=models.PROTECT)
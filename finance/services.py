@@ -10,7 +10,8 @@ from django.db import transaction
 from django.db.models import Case, When, Value, CharField, BooleanField, IntegerField
 from django.utils import timezone
 
-from .models import FinanceDocument, LedgerEntry, ExpenseCategory, Customer
+from .models import FinanceDocument, LedgerEntry, ExpenseCategory, Customer, Account, PaymentMethod
+from . import installments
 
 
 # -----------------------------
@@ -88,132 +89,67 @@ def criar_documento_manual(
     meio_pagamento: str = "",
     categoria_id: Optional[int] = None,
     categoria_parent_id: Optional[int] = None,
+    regras: Optional[dict] = None,
 ) -> FinanceDocument:
     """
     Cria um documento financeiro e gera os lançamentos (parcelas) associados.
-    Obs.: Categoria de despesa ainda não está modelada no LedgerEntry. Mantemos os parâmetros
-    por compatibilidade, mas eles não são persistidos em relação direta.
+    Parcelas: finance/installments.py (`regras` = regras de data de due_dates).
     """
     # Documento
     doc = FinanceDocument.objects.create(
         tipo=tipo,
         descricao=descricao,
-        valor_total=valor_total,
+        valor_total=installments.to_cents(valor_total),
         cliente_id=cliente_id if tipo == "CR" else None,
         fornecedor_nome=parceiro_nome if tipo == "CP" else "",
     )
+    installments.create_installments(
+        doc,
+        parcelas=parcelas,
+        primeiro_vencimento=primeiro_vencimento,
+        intervalo_dias=intervalo_dias,
+        regras=regras,
+        cliente_id=cliente_id if tipo == "CR" else None,
+        meio_pagamento=meio_pagamento or "",
+        expense_category_id=categoria_id if (tipo=="CP") else None,
+        expense_category_parent_id=categoria_parent_id if (tipo=="CP") else None,
+    )
+    return doc
 
-    # Geração das parcelas
-    if parcelas <= 0:
-        parcelas = 1
 
-    # Rateio simples do valor total
-    valor_parcela = (Decimal(valor_total) / Decimal(parcelas)).quantize(Decimal("0.01"))
-    data = primeiro_vencimento or timezone.localdate()
+# ==== Accounts & Payment Methods (leitura pelo registro em cache: finance/accounts.py) ====
+from . import accounts as _registry
 
-    entries = []
-    for i in range(parcelas):
-        e = LedgerEntry.objects.create(
-            documento=doc,
-            cliente_id=cliente_id if tipo == "CR" else None,
-            tipo=tipo,
-            descricao=f"{descricao} ({i+1}/{parcelas})",
-            valor=valor_parcela,
-            vencimento=data,
-            pago_em=None,
-            meio_pagamento=meio_pagamento or "",
-            expense_category_id=categoria_id if (tipo=="CP") else None,
-            expense_category_parent_id=categoria_parent_id if (tipo=="CP") else None,
-        )
-        entries.append(e)
-        data = data + timedelta(days=int(intervalo_dias or 30))
 
-    return doc
+def create_account(nome: str, tipo: str) -> int:
+    return Account.objects.create(nome=nome, tipo=tipo).pk
 
+def list_accounts() -> list[dict]:
+    return _registry.active_accounts()
 
-# ==== Accounts & Payment Methods (no migrations, raw SQL) ====
-from django.db import connection
-
-_ACCOUNT_SQL = """
-CREATE TABLE IF NOT EXISTS finance_account (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    nome TEXT NOT NULL,
-    tipo TEXT NOT NULL,
-    ativo INTEGER NOT NULL DEFAULT 1,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-);
-"""
-
-_PAYMENT_SQL = """
-CREATE TABLE IF NOT EXISTS finance_paymentmethod (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    nome TEXT NOT NULL,
-    tipo TEXT NOT NULL,
-    ativo INTEGER NOT NULL DEFAULT 1,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-);
-"""
-
-def _sqlq(v: str) -> str:
-    if v is None:
-        return ""
-    return str(v).replace("'", "''")
-
-
-def _ensure_tables():
-    with connection.cursor() as cur:
-        cur.execute(_ACCOUNT_SQL)
-        cur.execute(_PAYMENT_SQL)
+def account_balances(accounts: list[dict] | None = None) -> dict[int, dict]:
+    """Entradas, saídas e saldo (Decimal) de cada conta: {conta_id: {"in", "out", "balance"}}.
 
-def create_account(nome: str, tipo: str) -> int:
-    _ensure_tables()
-    sql = f"INSERT INTO finance_account (nome, tipo, ativo) VALUES ('{_sqlq(nome)}', '{_sqlq(tipo)}', 1)"
-    with connection.cursor() as cur:
-        cur.execute(sql)
-        return cur.lastrowid
+    Lê os saldos materializados em AccountBalance (finance/balances.py), uma
+    linha por conta.
+    """
+    from .balances import balances_for
+    if accounts is None:
+        accounts = list_accounts()
+    return balances_for([a["id"] for a in accounts])
 
-def list_accounts() -> list[dict]:
-    _ensure_tables()
-    with connection.cursor() as cur:
-        cur.execute("SELECT id, nome, tipo, ativo, created_at FROM finance_account WHERE ativo=1 ORDER BY id ASC")
-        rows = cur.fetchall()
-    res = []
-    for r in rows:
-        res.append({"id": r[0], "nome": r[1], "tipo": r[2], "ativo": r[3], "created_at": r[4]})
-    return res
 
 def account_balance(account_id: int) -> dict:
-    """Compute totals using LedgerEntry.meio_pagamento matching the account name (compat)."""
-    _ensure_tables()
-    with connection.cursor() as cur:
-        cur.execute(f"SELECT nome FROM finance_account WHERE id={int(account_id)}")
-        row = cur.fetchone()
-        if not row:
-            return {"in": 0, "out": 0, "balance": 0}
-        acc_name = row[0]
-    # Use ORM for sums
-    qs = LedgerEntry.objects.filter(meio_pagamento=acc_name).values_list("tipo", "valor", "pago_em")
-    total_in = sum([float(v) for t, v, pe in qs if t == "CR" and pe is not None])
-    total_out = sum([float(v) for t, v, pe in qs if t == "CP" and pe is not None])
-    return {"in": total_in, "out": total_out, "balance": total_in - total_out}
+    """Totais de uma conta (ver account_balances)."""
+    from .balances import balances_for
+    return balances_for([int(account_id)])[int(account_id)]
 
 # Payment Methods
-def create_payment_method(nome: str, tipo: str) -> int:
-    _ensure_tables()
-    with connection.cursor() as cur:
-        sql = f"INSERT INTO finance_paymentmethod (nome, tipo, ativo) VALUES ('{_sqlq(nome)}', '{_sqlq(tipo)}', 1)"
-        cur.execute(sql)
-        return cur.lastrowid
+def create_payment_method(nome: str, tipo: str = "") -> int:
+    return PaymentMethod.objects.create(nome=nome, tipo=tipo).pk
 
 def list_payment_methods() -> list[dict]:
-    _ensure_tables()
-    with connection.cursor() as cur:
-        cur.execute("SELECT id, nome, tipo, ativo, created_at FROM finance_paymentmethod WHERE ativo=1 ORDER BY nome ASC")
-        rows = cur.fetchall()
-    res = []
-    for r in rows:
-        res.append({"id": r[0], "nome": r[1], "tipo": r[2], "ativo": r[3], "created_at": r[4]})
-    return res
+    return _registry.active_payment_methods()
 
 
 
@@ -245,12 +181,12 @@ def has_document_for_origin(app_label: str, model: str, obj_id: int, tipo: str)
     return FinanceDocument.objects.filter(origem_ct=ct, origem_id=obj_id, tipo=tipo).exists()
 
 @transaction.atomic
-def gerar_cr_de_pedido(*, order_id: int, parcelas: int, primeiro_vencimento=None, intervalo_dias: int = 30, meio_pagamento: str = "", categoria_id=None, categoria_parent_id=None) -> FinanceDocument:
+def gerar_cr_de_pedido(*, order_id: int, parcelas: int, primeiro_vencimento=None, intervalo_dias: int = 30, meio_pagamento: str = "", categoria_id=None, categoria_parent_id=None, regras=None) -> FinanceDocument:
     # Import tardio para evitar import cycles
     from sales.models import SalesOrder
     order = SalesOrder.objects.select_related("cliente").get(id=order_id)
     descricao = f"Pedido #{order.id} - {order.cliente}"
-    valor = order.total_liquido or 0
+    valor = installments.to_cents(order.total_liquido)
     # Documento com vínculo à origem
     ct = ContentType.objects.get(app_label="sales", model="salesorder")
     doc = FinanceDocument.objects.create(
@@ -263,32 +199,52 @@ def gerar_cr_de_pedido(*, order_id: int, parcelas: int, primeiro_vencimento=None
         origem_id=order.id,
         status="open",
     )
-    # Parcelamento
-    if parcelas <= 0:
-        parcelas = 1
-    valor_parcela = (Decimal(str(valor)) / Decimal(parcelas)).quantize(Decimal("0.01"))
-    data = primeiro_vencimento or timezone.localdate()
-    for i in range(parcelas):
-        LedgerEntry.objects.create(
-            documento=doc,
-            cliente_id=order.cliente_id,
+    installments.create_installments(
+        doc,
+        parcelas=parcelas,
+        primeiro_vencimento=primeiro_vencimento,
+        intervalo_dias=intervalo_dias,
+        regras=regras,
+        cliente_id=order.cliente_id,
+        meio_pagamento=meio_pagamento or "",
+    )
+    return doc
+
+@transaction.atomic
+def gerar_cr_de_pedidos_lote(*, order_ids, parcelas: int = 1, primeiro_vencimento=None, intervalo_dias: int = 30, meio_pagamento: str = "", regras=None) -> list[FinanceDocument]:
+    """Gera o CR de vários pedidos de uma vez (documentos e parcelas com bulk_create).
+
+    Pedidos que já têm CR são ignorados.
+    """
+    from sales.models import SalesOrder
+    ct = ContentType.objects.get(app_label="sales", model="salesorder")
+    ja_tem = set(FinanceDocument.objects.filter(origem_ct=ct, origem_id__in=list(order_ids), tipo="CR").values_list("origem_id", flat=True))
+    orders = list(SalesOrder.objects.select_related("cliente").filter(id__in=list(order_ids)).exclude(id__in=ja_tem).order_by("id"))
+    docs = FinanceDocument.objects.bulk_create([
+        FinanceDocument(
             tipo="CR",
-            descricao=f"{descricao} ({i+1}/{parcelas})",
-            valor=valor_parcela,
-            vencimento=data,
-            pago_em=None,
-            meio_pagamento=meio_pagamento or "",
-            expense_category_id=None,
-            expense_category_parent_id=None,
+            descricao=f"Pedido #{o.id} - {o.cliente}",
+            valor_total=installments.to_cents(o.total_liquido),
+            cliente_id=o.cliente_id,
+            fornecedor_nome="",
+            origem_ct=ct,
+            origem_id=o.id,
+            status="open",
         )
-        data = data + timedelta(days=int(intervalo_dias or 30))
-    return doc
+        for o in orders
+    ])
+    entries = []
+    for doc in docs:
+        cronograma = installments.schedule(doc.valor_total, parcelas, primeiro_vencimento, intervalo_dias, **(regras or {}))
+        entries.extend(installments.build_entries(doc, cronograma, cliente_id=doc.cliente_id, meio_pagamento=meio_pagamento or ""))
+    LedgerEntry.objects.bulk_create(entries)
+    return docs
 
 @transaction.atomic
-def gerar_cp_de_entrada_estoque(*, mov_id: int, parcelas: int, primeiro_vencimento=None, intervalo_dias: int = 30, fornecedor_nome: str = "", categoria_id=None, categoria_parent_id=None) -> FinanceDocument:
+def gerar_cp_de_entrada_estoque(*, mov_id: int, parcelas: int, primeiro_vencimento=None, intervalo_dias: int = 30, fornecedor_nome: str = "", categoria_id=None, categoria_parent_id=None, regras=None) -> FinanceDocument:
     from inventory.models import StockMovement
     mov = StockMovement.objects.select_related("produto").get(id=mov_id)
-    total = (mov.quantidade or 0) * (mov.custo_unitario or 0)
+    total = installments.to_cents((mov.quantidade or 0) * (mov.custo_unitario or 0))
     descricao = f"Entrada #{mov.id} - {mov.produto}"
     # Documento com vínculo à origem
     ct = ContentType.objects.get(app_label="inventory", model="stockmovement")
@@ -302,59 +258,65 @@ def gerar_cp_de_entrada_estoque(*, mov_id: int, parcelas: int, primeiro_vencimen
         origem_id=mov.id,
         status="open",
     )
-    # Parcelamento
-    if parcelas <= 0:
-        parcelas = 1
-    valor_parcela = (Decimal(str(total)) / Decimal(parcelas)).quantize(Decimal("0.01"))
-    data = primeiro_vencimento or timezone.localdate()
-    for i in range(parcelas):
-        l = LedgerEntry.objects.create(
-            documento=doc,
-            cliente_id=None,
-            tipo="CP",
-            descricao=f"{descricao} ({i+1}/{parcelas})",
-            valor=valor_parcela,
-            vencimento=data,
-            pago_em=None,
-            meio_pagamento="",
-            expense_category_id=categoria_id,
-            expense_category_parent_id=categoria_parent_id,
-        )
-        data = data + timedelta(days=int(intervalo_dias or 30))
-        # Opcional: marcar categoria, se informado e for CP
-        try:
-            if categoria_parent_id:
-                setattr(l, "expense_category_parent_id", categoria_parent_id)
-            if categoria_id:
-                setattr(l, "expense_category_id", categoria_id)
-        except Exception:
-            pass
+    installments.create_installments(
+        doc,
+        parcelas=parcelas,
+        primeiro_vencimento=primeiro_vencimento,
+        intervalo_dias=intervalo_dias,
+        regras=regras,
+        expense_category_id=categoria_id,
+        expense_category_parent_id=categoria_parent_id,
+    )
     return doc
 
 
+@transaction.atomic
+def gerar_cp_de_entradas_lote(*, mov_ids, fornecedor_nome: str = "", parcelas: int = 1, primeiro_vencimento=None, intervalo_dias: int = 30, categoria_id=None, categoria_parent_id=None, regras=None) -> FinanceDocument:
+    """Gera UM documento CP consolidando várias entradas de estoque (ex.: uma nota de fornecedor).
+
+    O total é somado no banco e as parcelas são gravadas com um único bulk_create.
+    """
+    from django.db.models import F, Sum, Count, DecimalField, ExpressionWrapper
+    from inventory.models import StockMovement
+    movs = StockMovement.objects.filter(id__in=list(mov_ids))
+    agg = movs.aggregate(
+        total=Sum(ExpressionWrapper(F("quantidade") * F("custo_unitario"), output_field=DecimalField(max_digits=20, decimal_places=2))),
+        n=Count("id"),
+    )
+    total = Decimal(str(agg["total"] or 0)).quantize(Decimal("0.01"))
+    descricao = f"Entrada em lote ({agg['n'] or 0} itens)" + (f" - {fornecedor_nome}" if fornecedor_nome else "")
+    doc = FinanceDocument.objects.create(
+        tipo="CP",
+        descricao=descricao,
+        valor_total=total,
+        cliente_id=None,
+        fornecedor_nome=fornecedor_nome or "",
+        status="open",
+    )
+    installments.create_installments(
+        doc,
+        parcelas=parcelas,
+        primeiro_vencimento=primeiro_vencimento,
+        intervalo_dias=intervalo_dias,
+        regras=regras,
+        expense_category_id=categoria_id,
+        expense_category_parent_id=categoria_parent_id,
+    )
+    return doc
+
 
 def list_cashbook(account_id: int | None, start: date | None, end: date | None) -> list[dict]:
     """Retorna movimentos de caixa (apenas lançamentos pagos) para o extrato.
 
     Cada item: {"date": date, "account_id": int|None, "type": "in"|"out", "description": str, "amount": Decimal}
-    Filtro por conta é feito casando LedgerEntry.meio_pagamento com o nome da conta (compatibilidade).
+    Filtro por conta pela FK LedgerEntry.account (índice account + pago_em).
     """
-    # Mapear contas por nome<->id
-    try:
-        accounts = list_accounts()
-    except Exception:
-        accounts = []
-    name_to_id = {a["nome"]: a["id"] for a in accounts}
-
     qs = LedgerEntry.objects.all()
     # Somente movimentos efetivados (pago)
     qs = qs.exclude(pago_em__isnull=True)
 
-    # Filtro por conta (meio_pagamento == nome da conta)
     if account_id:
-        acc = next((a for a in accounts if a["id"] == int(account_id)), None)
-        if acc:
-            qs = qs.filter(meio_pagamento=acc["nome"])
+        qs = qs.filter(account_id=int(account_id))
 
     # Período pelo campo pago_em
     if start:
@@ -362,14 +324,13 @@ def list_cashbook(account_id: int | None, start: date | None, end: date | None)
     if end:
         qs = qs.filter(pago_em__lte=end)
 
-    qs = qs.order_by("pago_em", "id").values("id", "tipo", "descricao", "valor", "pago_em", "meio_pagamento")
+    qs = qs.order_by("pago_em", "id").values("id", "tipo", "descricao", "valor", "pago_em", "account_id")
 
     rows: list[dict] = []
     for r in qs:
-        acc_id = name_to_id.get(r["meio_pagamento"])
         rows.append({
             "date": r["pago_em"],
-            "account_id": acc_id,
+            "account_id": r["account_id"],
             "type": "in" if r["tipo"] == "CR" else "out",
             "description": r["descricao"],
             "amount": r["valor"],
@@ -382,7 +343,8 @@ def baixa_parcela(entry_id: int, *, data_pagto, meio: str = "", conta_id: int |
     Registra a baixa de um lançamento (CR/CP).
 
     - Seta `pago_em` com a data informada.
-    - Preenche `meio_pagamento` com o NOME da conta escolhida (compatível com o extrato).
+    - Grava a conta escolhida em `account` (extrato e saldo filtram pela FK) e o
+      nome dela em `meio_pagamento`, para exibição.
     - Atualiza o status do documento (open/partial/paid).
 
     Retorna True em caso de sucesso.
@@ -392,24 +354,18 @@ def baixa_parcela(entry_id: int, *, data_pagto, meio: str = "", conta_id: int |
     except LedgerEntry.DoesNotExist:
         return False
 
-    # Obter nome da conta pelo ID (o extrato casa pelo nome)
-    conta_nome = ""
-    try:
-        if conta_id is not None:
-            for a in list_accounts():
-                if int(a["id"]) == int(conta_id):
-                    conta_nome = a["nome"]
-                    break
-    except Exception:
-        pass
+    conta = _registry.get_account(conta_id) if conta_id is not None else None
+    if conta and not conta["ativo"]:
+        conta = None
 
     # Compat: priorize o nome da conta; se não houver, use o "meio" informado
-    meio_final = conta_nome or (meio or "")
+    meio_final = conta["nome"] if conta else (meio or "")
 
-    # Idempotência: se já estiver pago, apenas garanta o meio_pagamento
+    # Idempotência: se já estiver pago, apenas garanta conta e meio_pagamento
     le.pago_em = data_pagto
     le.meio_pagamento = meio_final
-    le.save(update_fields=["pago_em", "meio_pagamento"])
+    le.account_id = conta["id"] if conta else None
+    le.save(update_fields=["pago_em", "meio_pagamento", "account"])
 
     # Se houver documento, atualize o status conforme as parcelas
     if getattr(le, "documento_id", None):
@@ -0,0 +1,51 @@
+import logging
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from finance.models import Account, ExpenseCategory, LedgerEntry, PaymentMethod
+from finance import accounts, balances, categories
+
+logger = logging.getLogger(__name__)
+
+@receiver(post_save, sender=ExpenseCategory, dispatch_uid="finance_category_choices_save")
+@receiver(post_delete, sender=ExpenseCategory, dispatch_uid="finance_category_choices_delete")
+def _category_changed(sender, instance, **kwargs):
+    # Após o commit: antes dele outra requisição poderia recarregar o cache com o dado antigo
+    transaction.on_commit(_invalidate(categories.invalidate_cache, "categorias"))
+
+@receiver(post_save, sender=Account, dispatch_uid="finance_account_registry_save")
+@receiver(post_delete, sender=Account, dispatch_uid="finance_account_registry_delete")
+@receiver(post_save, sender=PaymentMethod, dispatch_uid="finance_payment_registry_save")
+@receiver(post_delete, sender=PaymentMethod, dispatch_uid="finance_payment_registry_delete")
+def _account_changed(sender, instance, **kwargs):
+    transaction.on_commit(_invalidate(accounts.invalidate_cache, "contas"))
+
+def _invalidate(fn, nome):
+    def run():
+        try:
+            fn()
+        except Exception:
+            logger.exception("Falha ao invalidar o cache de %s", nome)
+    return run
+
+def _entry_snapshot(entry):
+    return balances.entry_snapshot(entry.account_id, entry.tipo, entry.valor, entry.pago_em)
+
+@receiver(pre_save, sender=LedgerEntry, dispatch_uid="finance_entry_pre_save")
+def _entry_balance_snapshot(sender, instance, raw=False, **kwargs):
+    instance._balance_prev = None
+    if raw or not instance.pk:
+        return
+    row = LedgerEntry.objects.filter(pk=instance.pk).values_list("account_id", "tipo", "valor", "pago_em").first()
+    if row:
+        instance._balance_prev = balances.entry_snapshot(*row)
+
+@receiver(post_save, sender=LedgerEntry, dispatch_uid="finance_entry_post_save")
+def _entry_balance_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    balances.apply_entry_change(getattr(instance, "_balance_prev", None), _entry_snapshot(instance))
+
+@receiver(post_delete, sender=LedgerEntry, dispatch_uid="finance_entry_post_delete")
+def _entry_balance_deleted(sender, instance, **kwargs):
+    balances.apply_entry_change(_entry_snapshot(instance), None)
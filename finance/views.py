@@ -14,7 +14,8 @@ class FinanceHomeView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         accounts = services.list_accounts()
-        balances = [(a, services.account_balance(a["id"])) for a in accounts]
+        saldos = services.account_balances(accounts)
+        balances = [(a, saldos[a["id"]]) for a in accounts]
         ctx["accounts"] = accounts
         ctx["balances"] = balances
         ctx["cr_form"] = QuickCRForm()
@@ -94,13 +95,9 @@ class BaixaParcelaFormView(LoginRequiredMixin, View):
     template_name = "finance/baixa_form.html"
     def get(self, request, pk):
         form = BaixaForm()
-        choices = [(a["id"], f'{a["nome"]} ({a["tipo"]})') for a in services.list_accounts()]
-        form.fields["conta_id"].choices = choices
         return render(request, self.template_name, {"form": form, "entry_id": pk})
     def post(self, request, pk):
         form = BaixaForm(request.POST)
-        choices = [(a["id"], f'{a["nome"]} ({a["tipo"]})') for a in services.list_accounts()]
-        form.fields["conta_id"].choices = choices
         if form.is_valid():
             ok = services.baixa_parcela(
                 pk,
@@ -153,9 +150,10 @@ class AccountsListCreateView(LoginRequiredMixin, View):
     template_name = "finance/accounts.html"
     def get(self, request):
         accounts = services.list_accounts()
+        saldos = services.account_balances(accounts)
         rows = []
         for a in accounts:
-            b = services.account_balance(a['id'])
+            b = saldos[a['id']]
             rows.append({'a': a, 'saldo': b.get('balance', 0.0), 'saldo_fmt': services.format_brl(b.get('balance', 0.0))})
         return render(request, self.template_name, {'accounts': accounts, 'rows': rows})
 def post(self, request):
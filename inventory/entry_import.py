@@ -0,0 +1,127 @@
+"""Importação em lote de entradas de estoque a partir de CSV.
+
+Colunas (cabeçalho obrigatório): sku, quantidade, custo_unitario, fornecedor, motivo.
+Apenas sku e quantidade são obrigatórias. Aceita ';' ou ',' como separador e
+vírgula decimal.
+
+O arquivo é lido em streaming e gravado em blocos com bulk_create dentro de uma
+única transação; qualquer linha inválida cancela a importação inteira. Cada
+produto afetado é recalculado uma vez no commit e cada fornecedor recebe um
+único documento CP consolidado.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from products.models import Product
+from inventory.models import StockMovement
+from inventory.stock_collector import mark_dirty
+from inventory import valuation
+
+BATCH_SIZE = 1000
+
+
+class EntryImportError(Exception):
+    """Arquivo inválido; `errors` traz [(linha, mensagem)]."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} linha(s) inválida(s)")
+        self.errors = errors
+
+
+def _decimal(value):
+    value = (value or "").strip()
+    if not value:
+        return None
+    if "," in value:
+        value = value.replace(".", "").replace(",", ".")
+    value = Decimal(value)
+    if not value.is_finite():  # NaN/Infinity: tratados como valor inválido
+        raise InvalidOperation(value)
+    return value
+
+
+def _reader(fileobj):
+    if isinstance(fileobj, (bytes, bytearray)):
+        fileobj = io.BytesIO(fileobj)
+    fileobj = getattr(fileobj, "file", fileobj)  # UploadedFile do Django
+    if not isinstance(fileobj, io.TextIOBase):
+        fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    first = fileobj.readline()
+    delimiter = ";" if first.count(";") > first.count(",") else ","
+    header = [h.strip().lower() for h in next(csv.reader([first], delimiter=delimiter))]
+    return csv.DictReader(fileobj, fieldnames=header, delimiter=delimiter)
+
+
+def _batches(reader):
+    batch = []
+    # linha 1 é o cabeçalho
+    for lineno, row in enumerate(reader, start=2):
+        if not any((v or "").strip() for v in row.values() if isinstance(v, str)):
+            continue
+        batch.append((lineno, row))
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_entries_csv(fileobj, *, user=None, gerar_cp=True, parcelas=1, primeiro_vencimento=None, intervalo_dias=30):
+    """Importa entradas (tipo IN). Retorna {"movimentos", "produtos", "documentos"}.
+
+    Levanta `EntryImportError` (sem gravar nada) se houver linhas inválidas.
+    """
+    errors, produtos, por_fornecedor, total = [], set(), {}, 0
+    with transaction.atomic():
+        for batch in _batches(_reader(fileobj)):
+            skus = {(row.get("sku") or "").strip() for _n, row in batch}
+            by_sku = dict(Product.objects.filter(sku__in=skus).values_list("sku", "pk"))
+            objs, fornecedores = [], []
+            for lineno, row in batch:
+                sku = (row.get("sku") or "").strip()
+                try:
+                    qtd = _decimal(row.get("quantidade"))
+                    custo = _decimal(row.get("custo_unitario"))
+                except (InvalidOperation, ValueError):
+                    errors.append((lineno, "Quantidade/custo inválido."))
+                    continue
+                if sku not in by_sku:
+                    errors.append((lineno, f"SKU não encontrado: {sku or '(vazio)'}"))
+                    continue
+                if not qtd or qtd <= 0:
+                    errors.append((lineno, "Quantidade deve ser maior que zero."))
+                    continue
+                if custo is not None and custo < 0:
+                    errors.append((lineno, "Custo unitário não pode ser negativo."))
+                    continue
+                fornecedor = (row.get("fornecedor") or "").strip()
+                motivo = (row.get("motivo") or "").strip() or f"Importação CSV{' - ' + fornecedor if fornecedor else ''}"
+                objs.append(StockMovement(produto_id=by_sku[sku], tipo="IN", quantidade=qtd,
+                                          custo_unitario=custo, motivo=motivo[:200], criado_por=user))
+                fornecedores.append(fornecedor)
+            if errors:
+                continue  # segue validando o restante, mas nada será gravado
+            StockMovement.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+            for mov, fornecedor in zip(objs, fornecedores):
+                produtos.add(mov.produto_id)
+                por_fornecedor.setdefault(fornecedor, []).append(mov.pk)
+            # bulk_create não dispara sinais: valorização aplicada aqui, por produto
+            valuation.register_inbounds((m.produto_id, m.quantidade, m.custo_unitario, m.pk) for m in objs)
+            total += len(objs)
+
+        if errors:
+            raise EntryImportError(errors)
+
+        # Um recálculo por produto no commit
+        mark_dirty(*produtos)
+
+        documentos = []
+        if gerar_cp:
+            from finance import services as fin
+            for fornecedor, ids in por_fornecedor.items():
+                documentos.append(fin.gerar_cp_de_entradas_lote(
+                    mov_ids=ids, fornecedor_nome=fornecedor, parcelas=parcelas,
+                    primeiro_vencimento=primeiro_vencimento, intervalo_dias=intervalo_dias,
+                ))
+    return {"movimentos": total, "produtos": len(produtos), "documentos": documentos}
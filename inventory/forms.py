@@ -1,4 +1,5 @@
 from django import forms
+from core.widgets import Autocomplete
 from .models import StockMovement
 from products.models import Product
 
@@ -7,7 +8,7 @@ class StockEntryForm(forms.ModelForm):
         model = StockMovement
         fields = ['produto','quantidade','custo_unitario','motivo']
         widgets = {
-            'produto': forms.Select(attrs={'class':'form-select'}),
+            'produto': Autocomplete('inventory:products:search', label='{sku} - {nome}', hint='{ean}', attrs={'class':'form-control'}),
             'quantidade': forms.NumberInput(attrs={'class':'form-control','step':'0.01'}),
             'custo_unitario': forms.NumberInput(attrs={'class':'form-control','step':'0.01'}),
             'motivo': forms.TextInput(attrs={'class':'form-control'}),
@@ -20,6 +21,13 @@ class StockEntryForm(forms.ModelForm):
         return obj
 
 class StockAdjustForm(forms.Form):
-    produto = forms.ModelChoiceField(queryset=Product.objects.all(), widget=forms.Select(attrs={'class':'form-select'}))
+    produto = forms.ModelChoiceField(queryset=Product.objects.all(), widget=Autocomplete('inventory:products:search', label='{sku} - {nome}', hint='{ean}', attrs={'class':'form-control'}))
     novo_estoque = forms.DecimalField(decimal_places=2, max_digits=12, widget=forms.NumberInput(attrs={'class':'form-control','step':'0.01'}))
     motivo = forms.CharField(required=False, widget=forms.TextInput(attrs={'class':'form-control','placeholder':'Correção manual'}))
+
+class EntryImportForm(forms.Form):
+    arquivo = forms.FileField(label="Arquivo CSV", widget=forms.ClearableFileInput(attrs={'class':'form-control','accept':'.csv'}))
+    gerar_cp = forms.BooleanField(required=False, initial=True, label="Gerar CP por fornecedor", widget=forms.CheckboxInput(attrs={'class':'form-check-input'}))
+    parcelas = forms.IntegerField(min_value=1, initial=1, label="Parcelas", widget=forms.NumberInput(attrs={'class':'form-control'}))
+    primeiro_vencimento = forms.DateField(required=False, label="1º Vencimento", widget=forms.DateInput(attrs={'class':'form-control','type':'date'}))
+    intervalo_dias = forms.IntegerField(min_value=1, initial=30, label="Intervalo (dias)", widget=forms.NumberInput(attrs={'class':'form-control'}))
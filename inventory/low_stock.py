@@ -0,0 +1,75 @@
+"""Índice de reposição (LowStockAlert).
+
+A tabela só contém produtos que precisam de reposição, então a listagem é uma
+leitura indexada de poucas linhas. O índice é atualizado quando o saldo cruza
+o ponto de reposição/mínimo (deltas), quando o produto é salvo e nos caminhos
+em lote (rebuild/repair).
+"""
+from decimal import Decimal
+from products.models import Product
+from inventory.models import LowStockAlert
+
+CHUNK = 500
+
+
+def _dec(value):
+    return Decimal(str(value or 0))
+
+
+def alert_level(estoque, minimo, reposicao):
+    """'critico' abaixo do mínimo, 'repor' até o ponto de reposição, senão None."""
+    estoque, minimo, reposicao = _dec(estoque), _dec(minimo), _dec(reposicao)
+    if minimo > 0 and estoque < minimo:
+        return 'critico'
+    if reposicao > 0 and estoque <= reposicao:
+        return 'repor'
+    return None
+
+
+def _sync_chunk(ids):
+    levels = {
+        pk: alert_level(estoque, minimo, reposicao)
+        for pk, estoque, minimo, reposicao in Product.objects.filter(pk__in=ids)
+        .values_list('pk', 'estoque_atual', 'estoque_minimo', 'ponto_reposicao')
+    }
+    existing = dict(LowStockAlert.objects.filter(produto_id__in=ids).values_list('produto_id', 'nivel'))
+    remover = [pk for pk in existing if levels.get(pk) is None]
+    novos = [LowStockAlert(produto_id=pk, nivel=lv) for pk, lv in levels.items() if lv and pk not in existing]
+    if remover:
+        LowStockAlert.objects.filter(produto_id__in=remover).delete()
+    if novos:
+        LowStockAlert.objects.bulk_create(novos)
+    for pk, lv in levels.items():
+        if lv and pk in existing and existing[pk] != lv:
+            LowStockAlert.objects.filter(produto_id=pk).update(nivel=lv)
+    return len(remover) + len(novos)
+
+
+def sync_low_stock(product_ids=None):
+    """Ajusta o índice para os produtos informados (ou todos). Retorna linhas alteradas."""
+    if product_ids is None:
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    else:
+        ids = [pid for pid in product_ids if pid]
+    return sum(_sync_chunk(ids[i:i + CHUNK]) for i in range(0, len(ids), CHUNK))
+
+
+def on_stock_delta(product_id, delta):
+    """Chamado após um delta de estoque: só mexe no índice se o saldo cruzou um limite."""
+    row = Product.objects.filter(pk=product_id).values_list('estoque_atual', 'estoque_minimo', 'ponto_reposicao').first()
+    if not row:
+        return
+    novo, minimo, reposicao = row
+    if not _dec(minimo) and not _dec(reposicao):
+        return
+    if alert_level(_dec(novo) - _dec(delta), minimo, reposicao) != alert_level(novo, minimo, reposicao):
+        sync_low_stock([product_id])
+
+
+def products_to_replenish():
+    """Produtos que precisam de reposição, críticos primeiro."""
+    return (
+        Product.objects.filter(alerta_estoque__isnull=False)
+        .select_related('alerta_estoque')
+        .order_by('alerta_estoque__nivel', 'alerta_estoque__desde')
+    )
@@ -0,0 +1,43 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from inventory.stock_audit import audit_stock
+from inventory.stock_service import repair_stock
+
+class Command(BaseCommand):
+    help = "Verifica divergências entre estoque_atual e o histórico (entradas/ajustes/vendas)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Produtos por bloco verificado.")
+        parser.add_argument("--workers", type=int, default=0, help="Processos paralelos (0 = no processo atual).")
+        parser.add_argument("--fix", action="store_true", help="Corrige as divergências encontradas.")
+        parser.add_argument("--show", type=int, default=50, help="Quantas divergências listar (maiores primeiro).")
+        parser.add_argument("--quiet", action="store_true", help="Não mostrar o progresso por bloco.")
+
+    def handle(self, *args, **options):
+        def progress(done, total, found):
+            if not options["quiet"]:
+                self.stdout.write(f"  {done}/{total} produtos verificados, {found} divergentes")
+
+        total, drift = audit_stock(
+            chunk_size=max(1, options["chunk_size"]),
+            workers=max(0, options["workers"]),
+            progress=progress,
+        )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f"{total} produtos verificados, nenhuma divergência."))
+            return
+
+        drift.sort(key=lambda d: abs(Decimal(d[2]) - Decimal(d[1])), reverse=True)
+        total_abs = sum(abs(Decimal(esperado) - Decimal(atual)) for _pk, atual, esperado in drift)
+        self.stdout.write(self.style.WARNING(
+            f"{len(drift)} de {total} produtos divergentes (soma absoluta: {total_abs})."
+        ))
+        for pk, atual, esperado in drift[:max(0, options["show"])]:
+            diff = Decimal(esperado) - Decimal(atual)
+            self.stdout.write(f"  produto #{pk}: gravado {atual}, esperado {esperado} (diferença {diff:+})")
+
+        if options["fix"]:
+            fixed = repair_stock(drift)
+            self.stdout.write(self.style.SUCCESS(f"{fixed} produtos corrigidos."))
+        else:
+            self.stdout.write("Use --fix para corrigir.")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory.entry_import import import_entries_csv, EntryImportError
+
+class Command(BaseCommand):
+    help = "Importa entradas de estoque de um CSV (sku;quantidade;custo_unitario;fornecedor;motivo)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo")
+        parser.add_argument("--sem-cp", action="store_true", help="Não gerar CP por fornecedor.")
+        parser.add_argument("--parcelas", type=int, default=1)
+        parser.add_argument("--intervalo-dias", type=int, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["arquivo"], "rb") as f:
+                res = import_entries_csv(
+                    f,
+                    gerar_cp=not options["sem_cp"],
+                    parcelas=options["parcelas"],
+                    intervalo_dias=options["intervalo_dias"],
+                )
+        except EntryImportError as e:
+            for lineno, msg in e.errors[:50]:
+                self.stderr.write(f"  linha {lineno}: {msg}")
+            raise CommandError(f"Nada importado: {len(e.errors)} linha(s) inválida(s).")
+        self.stdout.write(self.style.SUCCESS(
+            f"{res['movimentos']} entradas importadas ({res['produtos']} produtos, {len(res['documentos'])} CP gerados)."
+        ))
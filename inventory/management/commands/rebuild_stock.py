@@ -1,13 +1,20 @@
 from django.core.management.base import BaseCommand
-from products.models import Product
-from inventory.stock_service import recompute_product_stock
+from inventory.stock_service import rebuild_all_products
+from inventory.low_stock import sync_low_stock
 
 class Command(BaseCommand):
-    help = "Recalcula estoque_atual de todos os produtos."
+    help = "Recalcula estoque_atual de todos os produtos (consultas agrupadas + bulk_update)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Produtos gravados por transação.")
 
     def handle(self, *args, **options):
-        total = 0
-        for p in Product.objects.all():
-            recompute_product_stock(p)
-            total += 1
-        self.stdout.write(self.style.SUCCESS(f"Estoque recalculado para {total} produtos."))
+        def progress(done, total, changed):
+            self.stdout.write(f"  {done}/{total} produtos verificados, {changed} alterados")
+
+        res = rebuild_all_products(chunk_size=max(1, options["chunk_size"]), progress=progress)
+        alertas = sync_low_stock()
+        self.stdout.write(self.style.SUCCESS(
+            f"Estoque recalculado para {res['total']} produtos ({res['changed']} alterados); "
+            f"{alertas} alertas de reposição ajustados."
+        ))
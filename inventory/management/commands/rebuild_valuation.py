@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from products.models import Product
+from sales.models import SalesOrder, SalesOrderItem
+from inventory.valuation import rebuild_valuations, stock_value_total, fifo_enabled
+
+
+def _columns(table):
+    with connection.cursor() as cur:
+        return {c.name for c in connection.introspection.get_table_description(cur, table)}
+
+
+class Command(BaseCommand):
+    help = "Refaz custo médio (e camadas FIFO, se habilitadas) repetindo o histórico de cada produto."
+
+    def add_arguments(self, parser):
+        parser.add_argument("produtos", nargs="*", type=int, help="IDs de produto (padrão: todos).")
+
+    def _ensure_schema(self):
+        # Datas das saídas usadas no replay (colunas que o migrate --run-syncdb não cria em tabelas antigas)
+        with connection.schema_editor() as editor:
+            for model, campo in ((SalesOrder, "confirmado_em"), (SalesOrderItem, "criado_em")):
+                if campo not in _columns(model._meta.db_table):
+                    editor.add_field(model, model._meta.get_field(campo))
+                    self.stdout.write(f"Coluna criada: {model._meta.db_table}.{campo}")
+                    # add_field preenche auto_now_add com "agora"; linhas antigas ficam sem data
+                    model.objects.update(**{campo: None})
+
+    def handle(self, *args, **options):
+        self._ensure_schema()
+        ids = options["produtos"] or list(Product.objects.values_list("pk", flat=True))
+        total = rebuild_valuations(ids)
+        msg = f"Valorização refeita para {total} produtos. Valor em estoque (custo médio): {stock_value_total()}"
+        if fifo_enabled():
+            msg += f"; FIFO: {stock_value_total('fifo')}"
+        self.stdout.write(self.style.SUCCESS(msg + "."))
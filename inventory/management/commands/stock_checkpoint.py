@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from inventory.stock_service import create_checkpoints
+
+class Command(BaseCommand):
+    help = "Grava checkpoints de saldo por produto (rodar periodicamente, ex.: fechamento do mês)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Checkpoints por INSERT.")
+
+    def handle(self, *args, **options):
+        total = create_checkpoints(chunk_size=max(1, options["chunk_size"]))
+        self.stdout.write(self.style.SUCCESS(f"{total} checkpoints de estoque gravados."))
@@ -11,30 +11,60 @@ class StockMovement(models.Model):
     motivo = models.CharField(max_length=200, blank=True)
     criado_por = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
     criado_em = models.DateTimeField(auto_now_add=True)
-    class Meta: ordering = ['-criado_em']
+    class Meta:
+        ordering = ['-criado_em']
+        # paginação por cursor (criado_em, id)
+        indexes = [models.Index(fields=['-criado_em', '-id'], name='inv_mov_criado_id_idx')]
     def __str__(self): return f"{self.get_tipo_display()} {self.quantidade} de {self.produto}"
 
-# === Estoque: sinais embutidos (não requer apps.ready) ===
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
+class StockCheckpoint(models.Model):
+    """Saldo consolidado de um produto até um ponto do histórico.
 
-try:
-    from .stock_service import recompute_product_stock
-except Exception:  # fallback robusto
-    def recompute_product_stock(product):  # pragma: no cover
-        try:
-            from inventory.stock_service import recompute_product_stock as _r
-            return _r(product)
-        except Exception:
-            return getattr(product, "estoque_atual", 0)
+    Cobre os StockMovement com id <= ultimo_movimento_id e os SalesOrderItem
+    com id <= ultimo_item_venda_id; recálculos e consultas "estoque em"
+    somam apenas as linhas posteriores.
+    """
+    produto = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='checkpoints')
+    saldo = models.DecimalField(max_digits=14, decimal_places=2)
+    ultimo_movimento_id = models.BigIntegerField(default=0)
+    ultimo_item_venda_id = models.BigIntegerField(default=0)
+    data = models.DateTimeField()
+    class Meta:
+        ordering = ['-data', '-id']
+        indexes = [models.Index(fields=['produto', 'data'])]
+    def __str__(self): return f"{self.produto} = {self.saldo} em {self.data:%d/%m/%Y %H:%M}"
 
-@receiver([post_save, post_delete], sender=StockMovement)
-def _inventory_movement_changed(sender, instance, **kwargs):
-    # Sempre que houver entrada/ajuste, recalcula o estoque do produto
-    try:
-        if instance and instance.produto_id:
-            recompute_product_stock(instance.produto)
-    except Exception:
-        # Nunca quebrar o fluxo do save
-        pass
-# === Fim dos sinais embutidos ===
+class ProductValuation(models.Model):
+    """Custo médio ponderado móvel e valor do estoque de um produto."""
+    produto = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='valuation')
+    quantidade = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    custo_medio = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    valor = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    cmv_acumulado = models.DecimalField("CMV acumulado", max_digits=16, decimal_places=2, default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    def __str__(self): return f"{self.produto}: {self.quantidade} x {self.custo_medio}"
+
+class CostLayer(models.Model):
+    """Camada FIFO: quantidade de uma entrada ainda não consumida e seu custo."""
+    produto = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='camadas_custo')
+    movimento = models.ForeignKey(StockMovement, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    quantidade = models.DecimalField(max_digits=12, decimal_places=2)
+    restante = models.DecimalField(max_digits=12, decimal_places=2)
+    custo_unitario = models.DecimalField(max_digits=14, decimal_places=4)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['produto', 'restante'])]
+
+class LowStockAlert(models.Model):
+    """Índice de produtos abaixo do ponto de reposição (só contém os que precisam de reposição)."""
+    NIVEIS = (('critico','Abaixo do mínimo'),('repor','Ponto de reposição'))
+    produto = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='alerta_estoque')
+    nivel = models.CharField(max_length=10, choices=NIVEIS)
+    desde = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        ordering = ['nivel', 'desde']
+        indexes = [models.Index(fields=['nivel', 'desde'])]
+    def __str__(self): return f"{self.produto} ({self.get_nivel_display()})"
+
+# Sinais de estoque: ver inventory/signals.py (registrados em InventoryConfig.ready)
@@ -1,14 +1,88 @@
-from django.db.models.signals import post_save, post_delete
+import logging
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from inventory.models import StockMovement
-from inventory.stock_service import recompute_product_stock
+from products.models import Product
+from inventory.stock_service import movement_contribution, apply_contribution_change, invalidate_checkpoints
+from inventory.stock_collector import mark_dirty, is_collecting
+from inventory import valuation
 
-@receiver([post_save, post_delete], sender=StockMovement)
-def _inventory_movement_changed(sender, instance, **kwargs):
-    # Sempre que houver uma entrada/ajuste, recalcule o estoque do produto
+logger = logging.getLogger(__name__)
+
+def _valuation(fn, *args):
+    # Valorização nunca quebra o save; divergências são refeitas com rebuild_valuation
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception("Falha ao atualizar a valorização do estoque (%s)", args)
+
+def _contribution(produto_id, tipo, quantidade):
+    return (produto_id, movement_contribution(tipo, quantidade))
+
+@receiver(pre_save, sender=StockMovement, dispatch_uid="inventory_movement_pre_save")
+def _inventory_movement_snapshot(sender, instance, raw=False, **kwargs):
+    # Guarda a contribuição anterior para aplicar só a diferença no post_save
+    instance._stock_prev = None
+    if raw or not instance.pk:
+        return
+    row = StockMovement.objects.filter(pk=instance.pk).values_list("produto_id", "tipo", "quantidade", "custo_unitario").first()
+    if row:
+        instance._stock_prev = _contribution(*row[:3])
+        instance._custo_prev = row[3]
+
+@receiver(post_save, sender=StockMovement, dispatch_uid="inventory_movement_post_save")
+def _inventory_movement_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, "_stock_prev", None)
+    new = _contribution(instance.produto_id, instance.tipo, instance.quantidade)
+    if old and old != new:
+        # Linha já coberta por checkpoint mudou: o checkpoint deixa de valer
+        invalidate_checkpoints({old[0], new[0]}, movement_id=instance.pk)
+    if created:
+        _valuation(valuation.register_movement, instance)
+    elif old and (old != new or getattr(instance, "_custo_prev", None) != instance.custo_unitario):
+        _valuation(valuation.mark_stale, old[0], new[0])
+    if is_collecting():
+        # Em lote: o produto é recalculado uma vez no commit
+        mark_dirty(instance.produto_id, old[0] if old else None)
+        return
+    try:
+        apply_contribution_change(old, new)
+    except Exception:
+        # Delta falhou: recalcula pelo histórico completo (nunca quebrar o save)
+        try:
+            mark_dirty(new[0], old[0] if old else None)
+        except Exception:
+            logger.exception("Falha ao atualizar estoque (%s #%s); rode audit_stock --fix", sender.__name__, instance.pk)
+
+@receiver(pre_delete, sender=StockMovement, dispatch_uid="inventory_movement_pre_delete")
+def _inventory_movement_delete_snapshot(sender, instance, **kwargs):
+    instance._stock_prev = _contribution(instance.produto_id, instance.tipo, instance.quantidade)
+
+@receiver(post_delete, sender=StockMovement, dispatch_uid="inventory_movement_post_delete")
+def _inventory_movement_deleted(sender, instance, **kwargs):
+    old = getattr(instance, "_stock_prev", None)
+    invalidate_checkpoints([instance.produto_id], movement_id=instance.pk)
+    _valuation(valuation.mark_stale, instance.produto_id)
+    if is_collecting():
+        mark_dirty(instance.produto_id)
+        return
+    try:
+        apply_contribution_change(old, None)
+    except Exception:
+        try:
+            mark_dirty(instance.produto_id)
+        except Exception:
+            logger.exception("Falha ao atualizar estoque (%s #%s); rode audit_stock --fix", sender.__name__, instance.pk)
+
+@receiver(post_save, sender=Product, dispatch_uid="inventory_product_low_stock")
+def _product_saved(sender, instance, raw=False, **kwargs):
+    # Mínimo/ponto de reposição ou saldo podem ter mudado (ex.: recompute_product_stock)
+    if raw:
+        return
     try:
-        if instance and instance.produto_id:
-            recompute_product_stock(instance.produto)
+        from inventory.low_stock import sync_low_stock
+        sync_low_stock([instance.pk])
     except Exception:
-        # Não quebrar o fluxo do save
-        pass
+        logger.exception("Falha ao atualizar o índice de reposição (Product #%s)", instance.pk)
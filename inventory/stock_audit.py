@@ -0,0 +1,57 @@
+"""Auditoria de consistência do estoque_atual contra o histórico.
+
+Cada bloco de produtos é verificado com consultas agrupadas
+(`stock_service.find_stock_drift`). Com `workers > 0` os blocos rodam num
+pool de processos; no SQLite cada processo abre o banco em modo somente
+leitura (`mode=ro`), sem disputar o lock de escrita.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from django.db import connections
+
+
+def _worker_init(alias):
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    conn = connections[alias]
+    conn.close()  # não reaproveitar conexão herdada no fork
+    if conn.vendor == "sqlite":
+        name = str(conn.settings_dict["NAME"])
+        if not name.startswith("file:"):
+            conn.settings_dict["NAME"] = f"file:{name}?mode=ro"
+
+
+def _audit_chunk(bounds):
+    from inventory.stock_service import find_stock_drift
+    first_id, last_id, n = bounds
+    return n, find_stock_drift(first_id, last_id)
+
+
+def audit_stock(chunk_size=5000, workers=0, progress=None, alias="default"):
+    """Retorna (total_verificado, [(product_id, gravado, esperado)]).
+
+    `progress(verificados, total, divergentes)` é chamado a cada bloco.
+    """
+    from inventory.stock_service import product_id_chunks
+    chunks = product_id_chunks(chunk_size)
+    total = sum(n for _first, _last, n in chunks)
+    drift, done = [], 0
+
+    if workers and len(chunks) > 1:
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init, initargs=(alias,)) as pool:
+            results = pool.map(_audit_chunk, chunks)
+            for n, parcial in results:
+                done += n
+                drift.extend(parcial)
+                if progress:
+                    progress(done, total, len(drift))
+    else:
+        for bounds in chunks:
+            n, parcial = _audit_chunk(bounds)
+            done += n
+            drift.extend(parcial)
+            if progress:
+                progress(done, total, len(drift))
+    return total, drift
@@ -0,0 +1,112 @@
+"""Coleta de produtos "sujos" por transação.
+
+Os sinais de estoque alimentam um conjunto de produtos afetados; cada produto
+é recalculado uma única vez quando a transação faz commit
+(`transaction.on_commit`). Fora de transação o recálculo é imediato.
+
+Operações em lote usam `coalesce_stock()` para suspender os deltas por linha:
+
+    with coalesce_stock():
+        ...  # N saves de itens/movimentos
+    # -> 1 recálculo por produto no commit
+"""
+import threading
+from contextlib import contextmanager
+from django.db import transaction
+
+_local = threading.local()
+
+
+class _DirtyProducts:
+    def __init__(self, using, handler):
+        self.using = using
+        self.handler = handler
+        self.ids = set()
+
+    def flush(self):
+        ids, self.ids = self.ids, set()
+        if ids:
+            self.handler(ids, using=self.using)
+
+
+def recompute_products(product_ids, using=None):
+    """Recalcula o estoque de cada produto informado (uma vez cada)."""
+    from products.models import Product
+    from inventory.stock_service import recompute_product_stock
+    ids = {pid for pid in product_ids if pid}
+    if not ids:
+        return 0
+    qs = Product.objects.using(using) if using else Product.objects
+    total = 0
+    for p in qs.filter(pk__in=ids):
+        recompute_product_stock(p)
+        total += 1
+    return total
+
+
+def _pending(handler, using=None, state_class=_DirtyProducts, create=True):
+    """Conjunto da transação corrente para `handler`; None quando em autocommit.
+
+    Com create=False devolve só um conjunto já aberto nesta transação (ou None).
+    """
+    conn = transaction.get_connection(using)
+    if not conn.in_atomic_block:
+        return None
+    states = getattr(_local, "states", None)
+    if states is None:
+        states = _local.states = {}
+    key = (conn.alias, handler)
+    state = states.get(key)
+    # Após commit/rollback o callback sai de run_on_commit: começa um conjunto novo
+    if state is None or not any(entry[1] == state.flush for entry in conn.run_on_commit):
+        if not create:
+            return None
+        state = states[key] = state_class(conn.alias, handler)
+        transaction.on_commit(state.flush, using=conn.alias)
+    return state
+
+
+def defer_per_product(handler, product_ids, using=None):
+    """Agenda `handler(ids, using=...)` uma vez por transação com os produtos acumulados."""
+    ids = {pid for pid in product_ids if pid}
+    if not ids:
+        return
+    state = _pending(handler, using)
+    if state is None:
+        handler(ids, using=using)
+    else:
+        state.ids.update(ids)
+
+
+def pending_batch(handler, state_class, using=None, create=True):
+    """Estado acumulado da transação corrente, descarregado por `handler(estado)` no commit.
+
+    `state_class(using, handler)` precisa expor `flush()`. Retorna None em
+    autocommit; com create=False, também quando a transação ainda não tem lote.
+    """
+    return _pending(handler, using, state_class, create)
+
+
+def mark_dirty(*product_ids, using=None):
+    """Marca produtos para recálculo no commit (ou recalcula já, sem transação)."""
+    defer_per_product(recompute_products, product_ids, using=using)
+
+
+def is_collecting():
+    """True dentro de `coalesce_stock()`: os sinais só marcam produtos."""
+    return getattr(_local, "depth", 0) > 0
+
+
+@contextmanager
+def coalesce_stock(using=None):
+    """Abre uma transação em que os sinais de estoque apenas marcam produtos.
+
+    Cada produto afetado é recalculado uma única vez no commit. Código que usa
+    `bulk_create`/`update` (sem sinais) pode chamar `mark_dirty` diretamente.
+    """
+    _local.depth = getattr(_local, "depth", 0) + 1
+    try:
+        with transaction.atomic(using=using):
+            yield
+    finally:
+        _local.depth -= 1
@@ -1,13 +1,21 @@
+from datetime import date, datetime, time
 from decimal import Decimal
 from django.db import transaction
-from django.db.models import Sum, Value, DecimalField
+from django.db.models import F, Max, Sum, Value, DecimalField
 from django.db.models.functions import Coalesce, Cast
-from inventory.models import StockMovement
+from django.utils import timezone
+from inventory.models import StockMovement, StockCheckpoint
 from sales.models import SalesOrderItem
 
 # Campo decimal padrão para coerção/aggregates
 DECIMAL = DecimalField(max_digits=20, decimal_places=2)
 ZERO = Value(Decimal('0'), output_field=DECIMAL)
+# Precisão de Product.estoque_atual: deltas e saldos esperados são arredondados igual
+STOCK_QUANT = Decimal('0.01')
+
+# Tipos de movimento que somam no saldo e status de pedido que baixam estoque
+MOVEMENT_TYPES = ('IN', 'ADJ')
+ACTIVE_ORDER_STATUSES = ('confirmed', 'invoiced')
 
 def _to_decimal(value):
     if value is None:
@@ -19,28 +27,123 @@ def _to_decimal(value):
     except Exception:
         return Decimal('0')
 
+def _stock_value(value):
+    return _to_decimal(value).quantize(STOCK_QUANT)
+
 def _sum_decimal(qs, field_name: str):
     # Garante tipos compatíveis no banco (evita FieldError: mixed types)
     return qs.aggregate(
         total=Coalesce(Sum(Cast(field_name, DECIMAL)), ZERO)
     )['total'] or Decimal('0')
 
-def recompute_product_stock(product):
-    """Recalcula o estoque_atual de um produto.
+def _movements(product_id=None, after_id=0, until=None):
+    qs = StockMovement.objects.filter(tipo__in=MOVEMENT_TYPES)
+    if product_id is not None:
+        qs = qs.filter(produto_id=product_id)
+    if after_id:
+        qs = qs.filter(id__gt=after_id)
+    if until is not None:
+        qs = qs.filter(criado_em__lte=until)
+    return qs
+
+def _sales(product_id=None, after_id=0, until=None):
+    qs = SalesOrderItem.objects.filter(pedido__status__in=ACTIVE_ORDER_STATUSES, produto_id__isnull=False)
+    if product_id is not None:
+        qs = qs.filter(produto_id=product_id)
+    if after_id:
+        qs = qs.filter(id__gt=after_id)
+    if until is not None:
+        qs = qs.filter(pedido__criado_em__lte=until)
+    return qs
+
+def _as_cutoff(when):
+    """Data -> fim do dia (timezone local); datetime ingênuo -> timezone local."""
+    if isinstance(when, datetime):
+        cutoff = when
+    elif isinstance(when, date):
+        cutoff = datetime.combine(when, time.max)
+    else:
+        raise TypeError("Informe date ou datetime.")
+    if timezone.is_naive(cutoff):
+        cutoff = timezone.make_aware(cutoff)
+    return cutoff
+
+def _balance_after(product_id, checkpoint=None, until=None):
+    base = checkpoint.saldo if checkpoint else Decimal('0')
+    mov_after = checkpoint.ultimo_movimento_id if checkpoint else 0
+    item_after = checkpoint.ultimo_item_venda_id if checkpoint else 0
+    total_in = _sum_decimal(_movements(product_id, mov_after, until), 'quantidade')
+    total_out = _sum_decimal(_sales(product_id, item_after, until), 'quantidade')
+    return _to_decimal(base) + _to_decimal(total_in) - _to_decimal(total_out)
+
+def compute_product_stock(product, use_checkpoint=True):
+    """Calcula o saldo pelo histórico, sem gravar nada.
     Regra:
       estoque = entradas(IN) + ajustes(ADJ) - saidas(itens de pedidos confirmed/invoiced)
+    Com `use_checkpoint`, parte do checkpoint mais recente e soma só as linhas posteriores.
+    """
+    product_id = getattr(product, 'pk', product)
+    checkpoint = None
+    if use_checkpoint:
+        checkpoint = StockCheckpoint.objects.filter(produto_id=product_id).order_by('-data', '-id').first()
+    return _balance_after(product_id, checkpoint)
+
+def stock_as_of(product, when):
+    """Saldo de um produto em uma data/hora (ex.: fechamento do mês).
+
+    Usa o checkpoint mais próximo anterior a `when`. Saídas são datadas pelo
+    `criado_em` do pedido e contam conforme o status atual do pedido.
+    """
+    product_id = getattr(product, 'pk', product)
+    cutoff = _as_cutoff(when)
+    checkpoint = (
+        StockCheckpoint.objects
+        .filter(produto_id=product_id, data__lte=cutoff)
+        .order_by('-data', '-id').first()
+    )
+    return _balance_after(product_id, checkpoint, cutoff)
+
+def stock_map_as_of(when, product_ids=None):
+    """Saldo de todos os produtos (ou dos informados) em uma data/hora.
+
+    Agrupa os produtos pelo checkpoint usado e soma o restante com
+    consultas agrupadas. Retorna {product_id: Decimal} (ausentes = zero).
     """
-    entradas_qs = StockMovement.objects.filter(produto=product, tipo='IN')
-    ajustes_qs = StockMovement.objects.filter(produto=product, tipo='ADJ')
-    saidas_qs = SalesOrderItem.objects.filter(
-        produto=product,
-        pedido__status__in=['confirmed', 'invoiced'],
+    cutoff = _as_cutoff(when)
+    cps = StockCheckpoint.objects.filter(data__lte=cutoff)
+    if product_ids is not None:
+        cps = cps.filter(produto_id__in=product_ids)
+    latest = StockCheckpoint.objects.filter(
+        id__in=cps.order_by().values('produto_id').annotate(last=Max('id')).values('last')
     )
+    saldo = {}
+    for pid, valor in latest.values_list('produto_id', 'saldo'):
+        saldo[pid] = _to_decimal(valor)
 
-    total_in = _sum_decimal(entradas_qs, 'quantidade') + _sum_decimal(ajustes_qs, 'quantidade')
-    total_out = _sum_decimal(saidas_qs, 'quantidade')
+    # Produtos sem checkpoint: histórico completo até a data
+    movs, saidas = _movements(until=cutoff), _sales(until=cutoff)
+    if product_ids is not None:
+        movs, saidas = movs.filter(produto_id__in=product_ids), saidas.filter(produto_id__in=product_ids)
+    com_checkpoint = latest.values('produto_id')
+    _merge(saldo, _grouped_balance(movs.exclude(produto_id__in=com_checkpoint), saidas.exclude(produto_id__in=com_checkpoint)))
 
-    novo = _to_decimal(total_in) - _to_decimal(total_out)
+    # Demais: só as linhas posteriores, uma rodada de consultas por limite de checkpoint
+    limites = latest.order_by().values_list('ultimo_movimento_id', 'ultimo_item_venda_id').distinct()
+    for mov_after, item_after in limites:
+        ids = latest.filter(ultimo_movimento_id=mov_after, ultimo_item_venda_id=item_after).values('produto_id')
+        _merge(saldo, _grouped_balance(
+            _movements(after_id=mov_after, until=cutoff).filter(produto_id__in=ids),
+            _sales(after_id=item_after, until=cutoff).filter(produto_id__in=ids),
+        ))
+    return saldo
+
+def recompute_product_stock(product):
+    """Recalcula o estoque_atual de um produto a partir do histórico completo.
+
+    Caminho de fallback/verificação: o fluxo normal aplica apenas deltas
+    (ver `apply_stock_delta`).
+    """
+    novo = compute_product_stock(product)
 
     # Atualiza somente se mudou
     if getattr(product, 'estoque_atual', None) != novo:
@@ -52,8 +155,196 @@ def recompute_product_stock(product):
 
     return product.estoque_atual
 
-@transaction.atomic
-def rebuild_all_products():
+def _grouped_balance(movs, saidas):
+    saldo = {}
+    for row in movs.order_by().values('produto_id').annotate(total=Coalesce(Sum(Cast('quantidade', DECIMAL)), ZERO)):
+        saldo[row['produto_id']] = _to_decimal(row['total'])
+    for row in saidas.order_by().values('produto_id').annotate(total=Coalesce(Sum(Cast('quantidade', DECIMAL)), ZERO)):
+        saldo[row['produto_id']] = saldo.get(row['produto_id'], Decimal('0')) - _to_decimal(row['total'])
+    return saldo
+
+def _merge(saldo, parcial):
+    for pid, valor in parcial.items():
+        saldo[pid] = saldo.get(pid, Decimal('0')) + valor
+
+def compute_stock_map(product_ids=None):
+    """Saldo de vários produtos em duas consultas agrupadas (GROUP BY produto).
+
+    Retorna {product_id: Decimal} apenas para produtos com histórico;
+    os ausentes têm saldo zero.
+    """
+    movs, saidas = _movements(), _sales()
+    if product_ids is not None:
+        movs = movs.filter(produto_id__in=product_ids)
+        saidas = saidas.filter(produto_id__in=product_ids)
+    return _grouped_balance(movs, saidas)
+
+def find_stock_drift(first_id=None, last_id=None):
+    """Compara estoque_atual com o histórico completo numa faixa de ids de produto.
+
+    Usa consultas agrupadas (sem checkpoints). Retorna
+    [(product_id, gravado, esperado)] somente para os produtos divergentes.
+    """
     from products.models import Product
-    for p in Product.objects.select_for_update().all():
-        recompute_product_stock(p)
+    products, movs, saidas = Product.objects.order_by('pk'), _movements(), _sales()
+    if first_id is not None:
+        products = products.filter(pk__gte=first_id)
+        movs, saidas = movs.filter(produto_id__gte=first_id), saidas.filter(produto_id__gte=first_id)
+    if last_id is not None:
+        products = products.filter(pk__lte=last_id)
+        movs, saidas = movs.filter(produto_id__lte=last_id), saidas.filter(produto_id__lte=last_id)
+    saldo = _grouped_balance(movs, saidas)
+    drift = []
+    for pk, atual in products.values_list('pk', 'estoque_atual'):
+        esperado = _stock_value(saldo.get(pk))
+        if _stock_value(atual) != esperado:
+            drift.append((pk, atual, esperado))
+    return drift
+
+def repair_stock(drift, chunk_size=500):
+    """Grava os saldos esperados de `find_stock_drift` com bulk_update. Retorna o total gravado."""
+    from products.models import Product
+    now = timezone.now()
+    objs = [Product(pk=pk, estoque_atual=esperado, atualizado_em=now) for pk, _atual, esperado in drift]
+    from inventory.low_stock import sync_low_stock
+    with transaction.atomic():
+        Product.objects.bulk_update(objs, ['estoque_atual', 'atualizado_em'], batch_size=chunk_size)
+        sync_low_stock([o.pk for o in objs])
+    return len(objs)
+
+def product_id_chunks(chunk_size=500):
+    """Faixas (primeiro_id, ultimo_id) com até `chunk_size` produtos cada."""
+    from products.models import Product
+    ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    return [(ids[i], ids[min(i + chunk_size, len(ids)) - 1], min(chunk_size, len(ids) - i))
+            for i in range(0, len(ids), chunk_size)]
+
+def rebuild_all_products(chunk_size=500, progress=None):
+    """Recalcula o estoque de todos os produtos de forma set-based.
+
+    Os saldos saem de consultas agrupadas por faixa de produtos; só as linhas
+    que mudaram são gravadas, com `bulk_update` (uma transação curta por
+    bloco, para não travar o SQLite durante todo o processo).
+    `progress(processados, total, alterados)` é chamado após cada bloco.
+    Retorna {"total": n, "changed": n}.
+    """
+    chunks = product_id_chunks(chunk_size)
+    total = sum(n for _first, _last, n in chunks)
+    done = changed = 0
+    for first_id, last_id, n in chunks:
+        drift = find_stock_drift(first_id, last_id)
+        if drift:
+            changed += repair_stock(drift, chunk_size)
+        done += n
+        if progress:
+            progress(done, total, changed)
+    return {"total": total, "changed": changed}
+
+
+# -----------------------------
+# Motor de deltas
+# -----------------------------
+
+def movement_contribution(tipo, quantidade):
+    """Quanto um StockMovement soma ao saldo do produto."""
+    if tipo not in MOVEMENT_TYPES:
+        return Decimal('0')
+    return _to_decimal(quantidade)
+
+def sale_contribution(status, quantidade):
+    """Quanto um SalesOrderItem soma ao saldo (negativo quando o pedido baixa estoque)."""
+    if status not in ACTIVE_ORDER_STATUSES:
+        return Decimal('0')
+    return -_to_decimal(quantidade)
+
+def apply_stock_delta(product_id, delta):
+    """Aplica `delta` ao estoque_atual com UPDATE atômico (F()), sem ler o histórico."""
+    delta = _stock_value(delta)
+    if not product_id or delta == 0:
+        return 0
+    from products.models import Product
+    from inventory.low_stock import on_stock_delta
+    updated = Product.objects.filter(pk=product_id).update(
+        estoque_atual=F('estoque_atual') + Value(delta, output_field=DECIMAL),
+        atualizado_em=timezone.now(),
+    )
+    if updated:
+        on_stock_delta(product_id, delta)
+    return updated
+
+def apply_stock_deltas(deltas):
+    """Aplica um dict {product_id: delta}; um UPDATE por produto afetado."""
+    for product_id, delta in (deltas or {}).items():
+        apply_stock_delta(product_id, delta)
+
+def apply_contribution_change(old, new):
+    """Aplica a diferença entre duas contribuições `(product_id, valor)`.
+
+    Cobre criação (old=None), exclusão (new=None), troca de produto,
+    de quantidade e de status num único passo.
+    """
+    deltas = {}
+    if old and old[0]:
+        deltas[old[0]] = deltas.get(old[0], Decimal('0')) - old[1]
+    if new and new[0]:
+        deltas[new[0]] = deltas.get(new[0], Decimal('0')) + new[1]
+    apply_stock_deltas(deltas)
+
+def order_status_deltas(order_id, old_status, new_status):
+    """Deltas por produto quando o status de um pedido entra/sai de ACTIVE_ORDER_STATUSES."""
+    was_active = old_status in ACTIVE_ORDER_STATUSES
+    is_active = new_status in ACTIVE_ORDER_STATUSES
+    if was_active == is_active:
+        return {}
+    sign = Decimal('-1') if is_active else Decimal('1')
+    rows = (
+        SalesOrderItem.objects
+        .filter(pedido_id=order_id, produto_id__isnull=False)
+        .values('produto_id')
+        .annotate(total=Coalesce(Sum(Cast('quantidade', DECIMAL)), ZERO))
+    )
+    return {r['produto_id']: sign * _to_decimal(r['total']) for r in rows}
+
+
+# -----------------------------
+# Checkpoints
+# -----------------------------
+
+def create_checkpoints(chunk_size=1000):
+    """Grava um checkpoint por produto com histórico, cobrindo tudo até agora.
+
+    Os limites (maior id de movimento e de item) são lidos antes das somas,
+    dentro da mesma transação, para que saldo e limites sejam coerentes.
+    Retorna o número de checkpoints criados.
+    """
+    with transaction.atomic():
+        last_mov = StockMovement.objects.aggregate(m=Max('id'))['m'] or 0
+        last_item = SalesOrderItem.objects.aggregate(m=Max('id'))['m'] or 0
+        saldo = _grouped_balance(
+            StockMovement.objects.filter(tipo__in=MOVEMENT_TYPES, id__lte=last_mov),
+            SalesOrderItem.objects.filter(pedido__status__in=ACTIVE_ORDER_STATUSES, produto_id__isnull=False, id__lte=last_item),
+        )
+        data = timezone.now()
+        objs = [
+            StockCheckpoint(produto_id=pid, saldo=valor, ultimo_movimento_id=last_mov,
+                            ultimo_item_venda_id=last_item, data=data)
+            for pid, valor in saldo.items()
+        ]
+        StockCheckpoint.objects.bulk_create(objs, batch_size=chunk_size)
+    return len(objs)
+
+def invalidate_checkpoints(product_ids, movement_id=None, item_id=None):
+    """Descarta checkpoints que já cobrem uma linha alterada/excluída.
+
+    Linhas novas nunca são cobertas (ids crescentes), então só edições,
+    exclusões e mudanças de status de pedido precisam chamar isto.
+    """
+    ids = [pid for pid in product_ids if pid]
+    if not ids:
+        return 0
+    qs = StockCheckpoint.objects.filter(produto_id__in=ids)
+    if movement_id is not None:
+        qs = qs.filter(ultimo_movimento_id__gte=movement_id)
+    if item_id is not None:
+        qs = qs.filter(ultimo_item_venda_id__gte=item_id)
+    return qs.delete()[0]
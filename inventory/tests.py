@@ -0,0 +1,45 @@
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from customers.models import Customer
+from products.models import Product
+from inventory.models import CostLayer, ProductValuation, StockMovement
+from inventory.valuation import rebuild_valuations
+from sales.models import SalesOrder, SalesOrderItem
+
+
+@override_settings(INVENTORY_FIFO_LAYERS=True)
+class ValuationReplayTest(TestCase):
+    """O replay (rebuild_valuations) precisa chegar ao mesmo resultado que o caminho incremental."""
+
+    def setUp(self):
+        self.cliente = Customer.objects.create(nome="Cliente Teste", cpf_cnpj="00000000000")
+        self.produto = Product.objects.create(sku="TST-1", nome="Produto 1")
+
+    def _estado(self):
+        v = ProductValuation.objects.get(produto=self.produto)
+        camadas = list(CostLayer.objects.filter(produto=self.produto).order_by("id").values_list("quantidade", "restante", "custo_unitario"))
+        return (v.quantidade, v.custo_medio, v.cmv_acumulado, camadas)
+
+    def _assert_replay_igual(self):
+        incremental = self._estado()
+        rebuild_valuations([self.produto.pk])
+        self.assertEqual(self._estado(), incremental)
+        return incremental
+
+    def test_order_confirmed_after_inbound(self):
+        pedido = SalesOrder.objects.create(cliente=self.cliente, status="draft")
+        SalesOrderItem.objects.create(pedido=pedido, produto=self.produto, quantidade=5, preco_unitario=Decimal("10.00"))
+        StockMovement.objects.create(produto=self.produto, tipo="IN", quantidade=10, custo_unitario=Decimal("4.00"))
+        pedido.status = "confirmed"
+        pedido.save()
+        quantidade, _custo, cmv, camadas = self._assert_replay_igual()
+        self.assertEqual((quantidade, cmv), (Decimal("5"), Decimal("20.00")))
+        self.assertEqual(camadas[0][1], Decimal("5"))
+
+    def test_item_added_to_confirmed_order_after_inbound(self):
+        StockMovement.objects.create(produto=self.produto, tipo="IN", quantidade=10, custo_unitario=Decimal("4.00"))
+        pedido = SalesOrder.objects.create(cliente=self.cliente, status="confirmed")
+        SalesOrderItem.objects.create(pedido=pedido, produto=self.produto, quantidade=2, preco_unitario=Decimal("10.00"))
+        StockMovement.objects.create(produto=self.produto, tipo="IN", quantidade=10, custo_unitario=Decimal("6.00"))
+        SalesOrderItem.objects.create(pedido=pedido, produto=self.produto, quantidade=4, preco_unitario=Decimal("10.00"))
+        self._assert_replay_igual()
@@ -10,6 +10,7 @@ urlpatterns = [
     path("cadastro/", TemplateView.as_view(template_name="portal/under_construction_inventory.html"), name="cadastro"),
     path("entradas/", views.EntryListView.as_view(), name="entries"),
     path("entradas/nova/", views.EntryCreateView.as_view(), name="entry_new"),
+    path("entradas/importar/", views.EntryImportView.as_view(), name="entry_import"),
     path("correcao/", views.AdjustView.as_view(), name="adjust"),
     path("produtos/", include(("products.urls","products"), namespace="products")),
 ]
@@ -0,0 +1,226 @@
+"""Valorização do estoque: custo médio ponderado móvel e camadas FIFO.
+
+Entradas (IN/ADJ positivo) recalculam o custo médio; saídas (itens de pedidos
+confirmed/invoiced e ajustes negativos) baixam ao custo médio e acumulam o
+CMV. Com `settings.INVENTORY_FIFO_LAYERS` as entradas também geram camadas
+`CostLayer`, consumidas da mais antiga para a mais nova.
+
+Criações são aplicadas incrementalmente; edições, exclusões e cancelamentos
+agendam `rebuild_valuations` (replay do histórico do produto) no commit.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum, DecimalField, ExpressionWrapper
+from inventory.models import StockMovement, ProductValuation, CostLayer
+from inventory.stock_collector import defer_per_product
+from inventory.stock_service import ACTIVE_ORDER_STATUSES, MOVEMENT_TYPES, _to_decimal
+
+CENT = Decimal('0.01')
+COST_PLACES = Decimal('0.0001')
+
+
+def fifo_enabled():
+    return bool(getattr(settings, "INVENTORY_FIFO_LAYERS", False))
+
+
+def _default_cost(product_id):
+    from products.models import Product
+    return _to_decimal(Product.objects.filter(pk=product_id).values_list('custo', flat=True).first())
+
+
+class _State:
+    """Estado de valorização de um produto enquanto eventos são aplicados."""
+
+    def __init__(self, valuation, fifo, replay=False):
+        self.v = valuation
+        self.fifo = fifo
+        self.replay = replay  # no replay as camadas gravadas já foram descartadas
+        self.layers = []  # CostLayer novas ou alteradas
+        for f in ('quantidade', 'custo_medio', 'cmv_acumulado'):
+            setattr(valuation, f, _to_decimal(getattr(valuation, f)))
+
+    def inbound(self, qty, unit_cost, movement_id=None):
+        v = self.v
+        qty = _to_decimal(qty)
+        if qty < 0:
+            return self.outbound(-qty)
+        if unit_cost is None:
+            unit_cost = v.custo_medio if v.quantidade > 0 and v.custo_medio else _default_cost(v.produto_id)
+        unit_cost = _to_decimal(unit_cost)
+        novo = v.quantidade + qty
+        if v.quantidade > 0 and novo > 0:
+            v.custo_medio = ((v.quantidade * v.custo_medio + qty * unit_cost) / novo).quantize(COST_PLACES, ROUND_HALF_UP)
+        else:
+            v.custo_medio = unit_cost.quantize(COST_PLACES, ROUND_HALF_UP)
+        v.quantidade = novo
+        if self.fifo and qty > 0:
+            self.layers.append(CostLayer(produto_id=v.produto_id, movimento_id=movement_id,
+                                         quantidade=qty, restante=qty, custo_unitario=unit_cost))
+        return Decimal('0')
+
+    def outbound(self, qty):
+        v = self.v
+        qty = _to_decimal(qty)
+        if qty <= 0:
+            return self.inbound(-qty, None)
+        cmv = (qty * v.custo_medio).quantize(CENT, ROUND_HALF_UP)
+        v.quantidade -= qty
+        v.cmv_acumulado = _to_decimal(v.cmv_acumulado) + cmv
+        if self.fifo:
+            self._consume_layers(qty)
+        return cmv
+
+    def _consume_layers(self, qty):
+        pendentes = [l for l in self.layers if l.restante > 0]
+        if not self.replay:
+            salvas = CostLayer.objects.filter(produto_id=self.v.produto_id, restante__gt=0).exclude(
+                pk__in=[l.pk for l in self.layers if l.pk])
+            pendentes = list(salvas.order_by('id')) + pendentes
+        for layer in pendentes:
+            if qty <= 0:
+                break
+            usado = min(layer.restante, qty)
+            layer.restante -= usado
+            qty -= usado
+            if layer not in self.layers:
+                self.layers.append(layer)
+
+    def save(self):
+        v = self.v
+        v.valor = (v.quantidade * v.custo_medio).quantize(CENT, ROUND_HALF_UP)
+        v.save()
+        novas = [l for l in self.layers if not l.pk]
+        alteradas = [l for l in self.layers if l.pk]
+        if novas:
+            CostLayer.objects.bulk_create(novas)
+        if alteradas:
+            CostLayer.objects.bulk_update(alteradas, ['restante'])
+
+
+def _state_for(product_id):
+    v, _ = ProductValuation.objects.select_for_update().get_or_create(produto_id=product_id)
+    return _State(v, fifo_enabled())
+
+
+@transaction.atomic
+def register_inbound(product_id, qty, unit_cost=None, movement_id=None):
+    """Entrada incremental (IN/ADJ). Sem custo informado usa o custo médio atual."""
+    if not product_id:
+        return
+    st = _state_for(product_id)
+    st.inbound(qty, unit_cost, movement_id)
+    st.save()
+
+
+@transaction.atomic
+def register_outbound(product_id, qty):
+    """Saída incremental ao custo médio; retorna o CMV da saída."""
+    if not product_id:
+        return Decimal('0')
+    st = _state_for(product_id)
+    cmv = st.outbound(qty)
+    st.save()
+    return cmv
+
+
+@transaction.atomic
+def register_inbounds(rows):
+    """Várias entradas `(product_id, qty, unit_cost, movement_id)`: um estado lido/gravado por produto."""
+    por_produto = {}
+    for product_id, qty, unit_cost, movement_id in rows:
+        if product_id:
+            por_produto.setdefault(product_id, []).append((qty, unit_cost, movement_id))
+    for product_id, entradas in por_produto.items():
+        st = _state_for(product_id)
+        for qty, unit_cost, movement_id in entradas:
+            st.inbound(qty, unit_cost, movement_id)
+        st.save()
+
+
+@transaction.atomic
+def register_outbounds(rows):
+    """Várias saídas `(product_id, qty)` (ex.: itens criados com bulk_create): uma baixa por produto."""
+    por_produto = {}
+    for product_id, qty in rows:
+        if product_id:
+            por_produto[product_id] = por_produto.get(product_id, Decimal('0')) + _to_decimal(qty)
+    return sum((register_outbound(pid, qty) for pid, qty in por_produto.items() if qty), Decimal('0'))
+
+
+def register_movement(movement):
+    if movement.tipo in MOVEMENT_TYPES:
+        register_inbound(movement.produto_id, movement.quantidade, movement.custo_unitario, movement.pk)
+
+
+def outbound_at(criado_em, confirmado_em, pedido_criado_em):
+    """Momento da saída de um item: criação do item ou confirmação do pedido, o que vier depois.
+
+    É quando o caminho incremental registra a saída (item criado em pedido já
+    confirmado, ou pedido confirmado com o item). Linhas antigas sem as datas
+    caem na criação do pedido.
+    """
+    confirmado = confirmado_em or pedido_criado_em
+    return max(confirmado, criado_em) if criado_em else confirmado
+
+
+def rebuild_valuations(product_ids, using=None):
+    """Refaz a valorização dos produtos repetindo seu histórico em ordem cronológica."""
+    from sales.models import SalesOrderItem
+    total = 0
+    for product_id in {pid for pid in product_ids if pid}:
+        eventos = [
+            (m['criado_em'], 0, m['id'], 'in', m['quantidade'], m['custo_unitario'])
+            for m in StockMovement.objects.filter(produto_id=product_id, tipo__in=MOVEMENT_TYPES)
+            .values('id', 'criado_em', 'quantidade', 'custo_unitario')
+        ]
+        eventos += [
+            (outbound_at(i['criado_em'], i['pedido__confirmado_em'], i['pedido__criado_em']), 1, i['id'], 'out',
+             i['quantidade'], None)
+            for i in SalesOrderItem.objects.filter(produto_id=product_id, pedido__status__in=ACTIVE_ORDER_STATUSES)
+            .values('id', 'criado_em', 'pedido__confirmado_em', 'pedido__criado_em', 'quantidade')
+        ]
+        eventos.sort(key=lambda e: e[:3])
+        with transaction.atomic():
+            CostLayer.objects.filter(produto_id=product_id).delete()
+            v, _ = ProductValuation.objects.select_for_update().get_or_create(produto_id=product_id)
+            v.quantidade = v.custo_medio = v.cmv_acumulado = Decimal('0')
+            st = _State(v, fifo_enabled(), replay=True)
+            for _data, _ordem, ref, tipo, qty, custo in eventos:
+                if tipo == 'in':
+                    st.inbound(qty, custo, ref)
+                else:
+                    st.outbound(qty)
+            st.save()
+        total += 1
+    return total
+
+
+def mark_stale(*product_ids):
+    """Agenda o replay da valorização dos produtos para o commit."""
+    defer_per_product(rebuild_valuations, product_ids)
+
+
+# -----------------------------
+# Consultas
+# -----------------------------
+
+_VALOR_FIFO = ExpressionWrapper(F('restante') * F('custo_unitario'), output_field=DecimalField(max_digits=20, decimal_places=4))
+
+
+def stock_value_by(group_by='produto_id', method='avg'):
+    """Valor do estoque agrupado por um campo (ex.: 'produto_id', 'produto__ncm') numa consulta.
+
+    `method='avg'` usa o custo médio; `method='fifo'` soma as camadas restantes.
+    """
+    if method == 'fifo':
+        return (CostLayer.objects.filter(restante__gt=0).order_by().values(group_by)
+                .annotate(quantidade=Sum('restante'), valor=Sum(_VALOR_FIFO)))
+    return (ProductValuation.objects.order_by().values(group_by)
+            .annotate(quantidade=Sum('quantidade'), valor=Sum('valor'), cmv=Sum('cmv_acumulado')))
+
+
+def stock_value_total(method='avg'):
+    if method == 'fifo':
+        return _to_decimal(CostLayer.objects.filter(restante__gt=0).aggregate(t=Sum(_VALOR_FIFO))['t'])
+    return _to_decimal(ProductValuation.objects.aggregate(t=Sum('valor'))['t'])
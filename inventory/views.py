@@ -4,8 +4,9 @@ from django.views.generic import TemplateView, ListView, CreateView, FormView
 from django.urls import reverse_lazy
 from django.contrib import messages
 from core.utils import has_module
+from core.pagination import KeysetPaginationMixin
 from .models import StockMovement
-from .forms import StockEntryForm, StockAdjustForm
+from .forms import StockEntryForm, StockAdjustForm, EntryImportForm
 
 class EstoqueRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     raise_exception = True
@@ -13,11 +14,21 @@ class EstoqueRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
 
 class InventoryHomeView(EstoqueRequiredMixin, TemplateView):
     template_name = "inventory/home.html"
+    alertas_limite = 50
+    def get_context_data(self, **kwargs):
+        from .low_stock import products_to_replenish
+        ctx = super().get_context_data(**kwargs)
+        # Leitura do índice LowStockAlert (só produtos abaixo do limite)
+        alertas = list(products_to_replenish()[:self.alertas_limite + 1])
+        ctx["alertas"] = alertas[:self.alertas_limite]
+        ctx["alertas_mais"] = len(alertas) > self.alertas_limite
+        return ctx
 
-class EntryListView(EstoqueRequiredMixin, ListView):
+class EntryListView(EstoqueRequiredMixin, KeysetPaginationMixin, ListView):
     model = StockMovement
     template_name = "inventory/entries_list.html"
     paginate_by = 25
+    keyset_estimate_count = True
     def get_queryset(self):
         return StockMovement.objects.select_related('produto','criado_por').all()
 
@@ -37,6 +48,26 @@ class EntryCreateView(EstoqueRequiredMixin, CreateView):
             messages.warning(self.request, f"Entrada registrada, mas não foi possível gerar CP automaticamente: {e}")
         return super().form_valid(form)
 
+class EntryImportView(EstoqueRequiredMixin, FormView):
+    template_name = "inventory/entry_import.html"
+    form_class = EntryImportForm
+    success_url = reverse_lazy("inventory:entries")
+    def form_valid(self, form):
+        from .entry_import import import_entries_csv, EntryImportError
+        try:
+            res = import_entries_csv(
+                form.cleaned_data['arquivo'],
+                user=self.request.user,
+                gerar_cp=form.cleaned_data.get('gerar_cp'),
+                parcelas=form.cleaned_data['parcelas'],
+                primeiro_vencimento=form.cleaned_data.get('primeiro_vencimento'),
+                intervalo_dias=form.cleaned_data['intervalo_dias'],
+            )
+        except EntryImportError as e:
+            return self.render_to_response(self.get_context_data(form=form, errors=e.errors[:100], errors_total=len(e.errors)))
+        messages.success(self.request, f"{res['movimentos']} entradas importadas ({res['produtos']} produtos, {len(res['documentos'])} CP gerados).")
+        return super().form_valid(form)
+
 class AdjustView(EstoqueRequiredMixin, FormView):
     template_name = "inventory/adjust_form.html"
     form_class = StockAdjustForm
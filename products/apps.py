@@ -4,3 +4,10 @@ class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
     verbose_name = 'Produtos'
+
+    def ready(self):
+        # Índice de busca e cache do typeahead
+        try:
+            from . import signals  # noqa: F401
+        except Exception:
+            pass
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products import search
+
+class Command(BaseCommand):
+    help = "Reconstrói o índice de busca de produtos (SQLite FTS5) e limpa o cache do typeahead."
+
+    def handle(self, *args, **options):
+        search.invalidate_cache()
+        if not search.index.create_table():
+            self.stdout.write(self.style.WARNING("FTS5 indisponível neste banco; a busca usa icontains."))
+            return
+        n = search.index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{n} produtos indexados."))
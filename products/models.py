@@ -3,6 +3,7 @@ from django.db import models
 
 class Product(models.Model):
     sku = models.CharField(max_length=50, unique=True)
+    ean = models.CharField("EAN/GTIN", max_length=14, blank=True, db_index=True)
     nome = models.CharField(max_length=120)
     descricao = models.TextField(blank=True)
     preco_venda = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -15,7 +16,9 @@ class Product(models.Model):
     unidade = models.CharField(max_length=5, default="UN")
 
     # Estoque básico
-    estoque_atual = models.IntegerField(default=0)
+    estoque_atual = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    estoque_minimo = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ponto_reposicao = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     # Locação
     disponivel_para_locacao = models.BooleanField(default=False)
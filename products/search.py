@@ -0,0 +1,88 @@
+"""Busca de produtos (listagens, API e typeahead de PDV).
+
+Ordem dos resultados:
+1. SKU/EAN exato;
+2. SKU/EAN começando pelo texto (faixa no índice único/indexado, sem LIKE);
+3. nome/descrição pelo índice FTS5 (core/fts.py), por relevância.
+
+`typeahead` guarda no cache o resultado de cada prefixo digitado; a versão
+do cache muda a cada alteração de produto (sinais), invalidando tudo.
+Com o LocMem padrão o cache é por processo: alterações feitas em outro
+processo aparecem em até CACHE_TTL (ou na hora, com CACHE_URL compartilhado).
+"""
+import hashlib
+from django.core.cache import cache
+from django.db.models import Q
+from core.fts import FtsIndex
+from products.models import Product
+
+CACHE_VERSION_KEY = "products:search:version"
+CACHE_TTL = 600
+# Sem estoque_atual: o saldo muda por UPDATE direto e deixaria o cache velho
+TYPEAHEAD_FIELDS = ("id", "sku", "ean", "nome", "preco_venda", "unidade")
+
+index = FtsIndex(
+    "products_product_fts", "products.Product",
+    columns=["sku", "ean", "nome", "descricao", "ncm"],
+    weights=[4.0, 4.0, 10.0, 2.0, 1.0],
+    row=lambda p: [p.sku or "", p.ean or "", p.nome or "", p.descricao or "", p.ncm or ""],
+)
+
+
+def _prefix(field, q):
+    # Faixa [q, q + maior caractere): usa o índice em qualquer banco, ao contrário de LIKE 'q%'
+    return Q(**{f"{field}__gte": q, f"{field}__lt": q + "\U0010ffff"})
+
+
+def search_products(qs, q):
+    """Filtra `qs` pelo texto `q` (código, nome, descrição, NCM); ordena por relevância com FTS5."""
+    q = (q or "").strip()
+    if not q:
+        return qs
+    ranked = index.filter(qs, q)
+    if ranked is not None:
+        return ranked.order_by("rank", "nome")
+    return qs.filter(
+        Q(sku__icontains=q) | Q(ean__startswith=q) | Q(nome__icontains=q) | Q(descricao__icontains=q) | Q(ncm__icontains=q)
+    )
+
+
+def _cache_version():
+    return cache.get_or_set(CACHE_VERSION_KEY, 1, None)
+
+
+def invalidate_cache():
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, 1, None)
+
+
+def typeahead(q, limit=10):
+    """Até `limit` produtos ativos para o texto digitado (lista de dicts, com cache por prefixo)."""
+    q = (q or "").strip()
+    if not q:
+        return []
+    digest = hashlib.md5(q.lower().encode()).hexdigest()
+    key = f"products:search:{_cache_version()}:{limit}:{digest}"
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    ativos = Product.objects.filter(ativo=True)
+    vistos, res = set(), []
+    for qs in (ativos.filter(Q(sku__in={q, q.upper()}) | Q(ean=q)),
+               ativos.filter(_prefix("sku", q) | _prefix("sku", q.upper()) | _prefix("ean", q)).order_by("sku")):
+        for row in qs.values(*TYPEAHEAD_FIELDS)[:limit]:
+            if row["id"] not in vistos:
+                vistos.add(row["id"])
+                res.append(row)
+    if len(res) < limit:
+        ranked = index.filter(ativos, q)
+        if ranked is None:
+            ranked = ativos.filter(Q(nome__icontains=q) | Q(descricao__icontains=q)).order_by("nome")
+        else:
+            ranked = ranked.order_by("rank", "nome")
+        for row in ranked.exclude(pk__in=vistos).values(*TYPEAHEAD_FIELDS)[:limit - len(res)]:
+            res.append(row)
+    cache.set(key, res, CACHE_TTL)
+    return res
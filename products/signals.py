@@ -0,0 +1,36 @@
+import logging
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from products.models import Product
+from products import search
+
+logger = logging.getLogger(__name__)
+
+# Saves só de saldo (recálculo de estoque) não mudam o que a busca mostra
+_STOCK_ONLY = {"estoque_atual", "atualizado_em"}
+
+def _invalidate_cache():
+    # Após o commit: antes dele outra requisição poderia recarregar o cache com o dado antigo
+    try:
+        search.invalidate_cache()
+    except Exception:
+        logger.exception("Falha ao invalidar o cache da busca de produtos")
+
+@receiver(post_save, sender=Product, dispatch_uid="products_search_index")
+def _product_indexed(sender, instance, raw=False, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= _STOCK_ONLY:
+        return
+    try:
+        search.index.index(instance)
+    except Exception:
+        logger.exception("Falha ao indexar produto #%s; rode rebuild_product_search", instance.pk)
+    transaction.on_commit(_invalidate_cache)
+
+@receiver(post_delete, sender=Product, dispatch_uid="products_search_unindex")
+def _product_unindexed(sender, instance, **kwargs):
+    try:
+        search.index.unindex(instance.pk)
+    except Exception:
+        logger.exception("Falha ao remover produto #%s do índice de busca", instance.pk)
+    transaction.on_commit(_invalidate_cache)
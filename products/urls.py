@@ -5,4 +5,5 @@ urlpatterns = [
     path("", views.ProductListView.as_view(), name="list"),
     path("novo/", views.ProductCreateView.as_view(), name="new"),
     path("<int:pk>/editar/", views.ProductUpdateView.as_view(), name="edit"),
+    path("buscar/", views.ProductTypeaheadView.as_view(), name="search"),
 ]
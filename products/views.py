@@ -1,6 +1,7 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import JsonResponse
 from django.urls import reverse_lazy
-from django.views.generic import ListView, CreateView, UpdateView
+from django.views.generic import ListView, CreateView, UpdateView, View
 from core.utils import has_module
 from .models import Product
 from .forms import ProductForm
@@ -14,10 +15,8 @@ class ProductListView(EstoqueRequiredMixin, ListView):
     template_name = "products/product_list.html"
     paginate_by = 25
     def get_queryset(self):
-        qs = Product.objects.all().order_by("nome")
-        q = self.request.GET.get("q")
-        if q: qs = qs.filter(nome__icontains=q) | qs.filter(sku__icontains=q)
-        return qs
+        from .search import search_products
+        return search_products(Product.objects.all().order_by("nome"), self.request.GET.get("q"))
 
 class ProductCreateView(EstoqueRequiredMixin, CreateView):
     model = Product
@@ -30,3 +29,14 @@ class ProductUpdateView(EstoqueRequiredMixin, UpdateView):
     form_class = ProductForm
     template_name = "products/product_form.html"
     success_url = reverse_lazy("inventory:products:list")
+
+class ProductTypeaheadView(LoginRequiredMixin, View):
+    """JSON para autocomplete/PDV: ?q=texto&limit=10 (código exato/prefixo primeiro, depois nome)."""
+    raise_exception = True
+    def get(self, request):
+        from .search import typeahead
+        try:
+            limit = min(max(int(request.GET.get("limit", 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        return JsonResponse({"results": typeahead(request.GET.get("q", ""), limit)})
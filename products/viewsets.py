@@ -1,15 +1,35 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from core.permissions import IsStaffOrReadOnly
 from .models import Product
 from .serializers import ProductSerializer
 
+class ProductSearchFilter(filters.SearchFilter):
+    """?search= pelo índice de produtos (FTS5, por relevância), com fallback icontains."""
+
+    def filter_queryset(self, request, queryset, view):
+        from .search import search_products
+        termos = self.get_search_terms(request)
+        return search_products(queryset, " ".join(termos)) if termos else queryset
+
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all().order_by("-criado_em")
     serializer_class = ProductSerializer
     permission_classes = [IsStaffOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
     filterset_fields = ["ativo","disponivel_para_locacao"]
-    search_fields = ["sku","nome","descricao","ncm"]
+    search_fields = ["sku","ean","nome","descricao","ncm"]
     ordering_fields = ["preco_venda","criado_em","atualizado_em"]
+
+    @action(detail=False, methods=["get"])
+    def reposicao(self, request):
+        """Produtos abaixo do mínimo/ponto de reposição (índice LowStockAlert)."""
+        from inventory.low_stock import products_to_replenish
+        qs = products_to_replenish()
+        page = self.paginate_queryset(qs)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(qs, many=True).data)
@@ -0,0 +1,92 @@
+"""Conversão de orçamentos em pedidos (um ou vários numa única transação).
+
+Pedidos e itens são gravados com bulk_create; como não há sinais por linha,
+o serviço aplica de uma vez o que eles fariam: totais gravados, valorização
+(uma saída por produto) e estoque (um recálculo por produto no commit).
+"""
+from collections import defaultdict
+from django.utils import timezone
+from inventory import valuation
+from inventory.stock_collector import coalesce_stock, mark_dirty
+from sales import cube
+from sales.models import Quote, SalesOrder, SalesOrderItem
+from sales.totals import item_total, ZERO
+
+CONVERTIBLE = ("draft", "sent", "approved")
+
+
+def convert_quotes(quote_ids, *, user=None, gerar_cr=False, parcelas=1, primeiro_vencimento=None,
+                   intervalo_dias=30, meio_pagamento=""):
+    """Converte os orçamentos em pedidos confirmados.
+
+    Retorna uma lista (na ordem dos ids) de {"orcamento", "pedido", "criado", "erro"}.
+    Orçamentos já convertidos devolvem o pedido existente (criado=False).
+    """
+    ids = list(dict.fromkeys(int(pk) for pk in quote_ids))
+    resultados = {pk: {"orcamento": pk, "pedido": None, "criado": False, "erro": "Orçamento não encontrado."} for pk in ids}
+    with coalesce_stock():
+        quotes = list(
+            Quote.objects.select_for_update().filter(pk__in=ids)
+            .select_related("cliente").prefetch_related("itens").order_by("pk")
+        )
+        pendentes = []
+        for q in quotes:
+            res = resultados[q.pk]
+            res["erro"] = None
+            if q.pedido_id:
+                res["pedido"] = q.pedido_id
+            elif q.status not in CONVERTIBLE:
+                res["erro"] = f"Orçamento {q.get_status_display().lower()} não pode ser aprovado."
+            else:
+                pendentes.append(q)
+        if not pendentes:
+            return [resultados[pk] for pk in ids]
+
+        orders, itens_por_quote = [], []
+        for q in pendentes:
+            itens = list(q.itens.all())
+            bruto = sum((item_total(i.quantidade, i.preco_unitario) for i in itens), ZERO)
+            orders.append(SalesOrder(
+                cliente_id=q.cliente_id,
+                desconto_total=q.desconto_total,
+                observacoes=f"Convertido do Orçamento #{q.id}",
+                criado_por=user,
+                status="confirmed",
+                confirmado_em=timezone.now(),
+                total_bruto=bruto,
+                total_liquido=bruto - (q.desconto_total or 0),
+                item_count=len(itens),
+            ))
+            itens_por_quote.append(itens)
+        SalesOrder.objects.bulk_create(orders)
+
+        novos = [
+            SalesOrderItem(pedido_id=order.pk, produto_id=i.produto_id, descricao=i.descricao,
+                           quantidade=i.quantidade, preco_unitario=i.preco_unitario)
+            for order, itens in zip(orders, itens_por_quote) for i in itens
+        ]
+        SalesOrderItem.objects.bulk_create(novos, batch_size=1000)
+
+        saidas = defaultdict(lambda: ZERO)
+        for item in novos:
+            if item.produto_id:
+                saidas[item.produto_id] += item.quantidade
+        valuation.register_outbounds(saidas.items())
+        mark_dirty(*saidas)
+        cube.add_orders([o.pk for o in orders])
+
+        agora = timezone.now()
+        for q, order in zip(pendentes, orders):
+            q.status, q.pedido_id, q.atualizado_em = "approved", order.pk, agora
+            resultados[q.pk].update(pedido=order.pk, criado=True)
+        Quote.objects.bulk_update(pendentes, ["status", "pedido", "atualizado_em"])
+
+        if gerar_cr:
+            from finance import services as fin
+            fin.gerar_cr_de_pedidos_lote(order_ids=[o.pk for o in orders], parcelas=parcelas, primeiro_vencimento=primeiro_vencimento,
+                                         intervalo_dias=intervalo_dias, meio_pagamento=meio_pagamento)
+    return [resultados[pk] for pk in ids]
+
+
+def convert_quote(quote_id, **kwargs):
+    return convert_quotes([quote_id], **kwargs)[0]
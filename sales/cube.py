@@ -0,0 +1,255 @@
+"""Cubo diário de vendas (SalesDailyCube).
+
+Cada célula (data, produto, cliente, vendedor) soma quantidade e valor dos
+itens de pedidos confirmed/invoiced e conta os pedidos distintos. Mudanças em
+itens e pedidos viram deltas por célula, aplicados em poucas consultas por
+`apply_cells`; `rebuild_cube` refaz tudo (ou a partir de uma data) a partir
+dos itens.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from inventory.stock_service import ACTIVE_ORDER_STATUSES
+from sales.models import SalesDailyCube, SalesOrder, SalesOrderItem
+from sales.totals import item_total
+
+ZERO = Decimal('0')
+BATCH_SIZE = 1000
+
+
+def order_key(status, criado_em, cliente_id, vendedor_id):
+    """Parte (data, cliente, vendedor) da célula; None se o pedido não conta como venda."""
+    if status not in ACTIVE_ORDER_STATUSES or criado_em is None:
+        return None
+    return (timezone.localdate(criado_em), cliente_id, vendedor_id)
+
+
+def order_key_for(order_id):
+    row = SalesOrder.objects.filter(pk=order_id).values_list("status", "criado_em", "cliente_id", "criado_por_id").first()
+    return order_key(*row) if row else None
+
+
+def _cell(key, produto_id):
+    return (key[0], produto_id, key[1], key[2])
+
+
+def _count_orders(cell):
+    """Pedidos distintos que hoje contribuem para a célula."""
+    data, produto_id, cliente_id, vendedor_id = cell
+    inicio = timezone.make_aware(datetime.combine(data, time.min))
+    fim = timezone.make_aware(datetime.combine(data + timedelta(days=1), time.min))
+    return (
+        SalesOrderItem.objects.filter(
+            produto_id=produto_id, pedido__cliente_id=cliente_id, pedido__criado_por_id=vendedor_id,
+            pedido__status__in=ACTIVE_ORDER_STATUSES, pedido__criado_em__gte=inicio, pedido__criado_em__lt=fim,
+        ).values("pedido_id").distinct().count()
+    )
+
+
+def apply_cells(cells, recount=()):
+    """Aplica {(data, produto_id, cliente_id, vendedor_id): [quantidade, valor, pedidos]}.
+
+    Para as células em `recount` a contagem de pedidos é refeita no banco em vez
+    de somada (mudanças de item: vários itens do mesmo produto/pedido, exclusões
+    em lote ou em cascata).
+    """
+    recount = set(recount)
+    cells = {k: v for k, v in cells.items() if any(v) or k in recount}
+    if not cells:
+        return
+    with transaction.atomic():
+        existentes = {}
+        qs = SalesDailyCube.objects.select_for_update().filter(
+            data__in={k[0] for k in cells}, cliente_id__in={k[2] for k in cells},
+        )
+        for row in qs:
+            existentes[(row.data, row.produto_id, row.cliente_id, row.vendedor_id)] = row
+        novos, alterados, vazios = [], [], []
+        for key, (qtd, valor, pedidos) in cells.items():
+            row = existentes.get(key)
+            if key in recount:
+                pedidos = _count_orders(key) - (row.pedidos if row else 0)
+            if row is None:
+                if pedidos > 0:
+                    novos.append(SalesDailyCube(data=key[0], produto_id=key[1], cliente_id=key[2], vendedor_id=key[3],
+                                                quantidade=qtd, valor_bruto=valor, pedidos=pedidos))
+                continue
+            row.quantidade += qtd
+            row.valor_bruto += valor
+            row.pedidos += pedidos
+            (vazios if row.pedidos <= 0 else alterados).append(row)
+        if novos:
+            SalesDailyCube.objects.bulk_create(novos, batch_size=BATCH_SIZE)
+        if alterados:
+            SalesDailyCube.objects.bulk_update(alterados, ["quantidade", "valor_bruto", "pedidos"], batch_size=BATCH_SIZE)
+        if vazios:
+            SalesDailyCube.objects.filter(pk__in=[r.pk for r in vazios]).delete()
+
+
+def merge_seller_cells(vendedor_id):
+    """Vendedor será excluído: suas células passam para vendedor=None, somadas às já existentes.
+
+    O SET_NULL do banco deixaria células repetidas sem vendedor; como cada pedido
+    tem um só vendedor, `pedidos` pode ser somado sem recontagem.
+    """
+    with transaction.atomic():
+        rows = list(SalesDailyCube.objects.select_for_update().filter(vendedor_id=vendedor_id))
+        if not rows:
+            return
+        cells = defaultdict(lambda: [ZERO, ZERO, 0])
+        for row in rows:
+            c = cells[(row.data, row.produto_id, row.cliente_id, None)]
+            c[0] += row.quantidade
+            c[1] += row.valor_bruto
+            c[2] += row.pedidos
+        SalesDailyCube.objects.filter(pk__in=[r.pk for r in rows]).delete()
+        apply_cells(cells)
+
+
+def item_changed(old, new):
+    """`old`/`new` = (pedido_id, chave do pedido, produto_id, quantidade, valor) ou None."""
+    cells = defaultdict(lambda: [ZERO, ZERO, 0])
+    recount = set()
+    if old and new and old[1] and old[1:3] == new[1:3] and old[0] == new[0]:
+        c = cells[_cell(new[1], new[2])]
+        c[0] += new[3] - old[3]
+        c[1] += new[4] - old[4]
+    else:
+        for snap, sign in ((old, -1), (new, 1)):
+            if snap and snap[1]:
+                cell = _cell(snap[1], snap[2])
+                cells[cell][0] += sign * snap[3]
+                cells[cell][1] += sign * snap[4]
+                recount.add(cell)
+    apply_cells(cells, recount)
+
+
+def item_snapshot(pedido_id, produto_id, quantidade, preco_unitario, key=None):
+    if key is None:
+        key = order_key_for(pedido_id)
+    return (pedido_id, key, produto_id, Decimal(quantidade or 0), item_total(quantidade, preco_unitario))
+
+
+def _order_cells(order_ids, sign=1, keys=None):
+    """Contribuição dos pedidos informados; `keys` substitui a chave atual de cada pedido."""
+    cells = defaultdict(lambda: [ZERO, ZERO, 0])
+    if keys is None:
+        keys = {
+            pk: order_key(st, dt, cli, vend)
+            for pk, st, dt, cli, vend in SalesOrder.objects.filter(pk__in=list(order_ids))
+            .values_list("pk", "status", "criado_em", "cliente_id", "criado_por_id")
+        }
+    vistos = set()
+    rows = SalesOrderItem.objects.filter(pedido_id__in=[pk for pk, k in keys.items() if k]).values_list(
+        "pedido_id", "produto_id", "quantidade", "preco_unitario")
+    for pedido_id, produto_id, qtd, preco in rows.iterator():
+        cell = _cell(keys[pedido_id], produto_id)
+        c = cells[cell]
+        c[0] += sign * Decimal(qtd or 0)
+        c[1] += sign * item_total(qtd, preco)
+        if (cell, pedido_id) not in vistos:
+            vistos.add((cell, pedido_id))
+            c[2] += sign
+    return cells
+
+
+def order_changed(order_id, old_key, new_key):
+    """Pedido mudou de status/data/cliente/vendedor: move sua contribuição entre células."""
+    if old_key == new_key:
+        return
+    cells = defaultdict(lambda: [ZERO, ZERO, 0])
+    for parte in (_order_cells([order_id], -1, {order_id: old_key}), _order_cells([order_id], 1, {order_id: new_key})):
+        for k, (q, v, n) in parte.items():
+            c = cells[k]
+            c[0] += q
+            c[1] += v
+            c[2] += n
+    apply_cells(cells)
+
+
+def orders_snapshot(order_ids):
+    """Contribuição atual dos pedidos, para `apply_orders_diff` depois de alterá-los."""
+    return _order_cells(order_ids)
+
+
+def apply_orders_diff(order_ids, antes):
+    """Aplica a diferença entre a contribuição atual dos pedidos e `antes` (orders_snapshot)."""
+    cells = _order_cells(order_ids)
+    for k, (q, v, n) in antes.items():
+        c = cells[k]
+        c[0] -= q
+        c[1] -= v
+        c[2] -= n
+    apply_cells(cells)
+
+
+def add_orders(order_ids):
+    """Inclui no cubo pedidos gravados sem sinais (bulk_create)."""
+    apply_cells(_order_cells(order_ids))
+
+
+@transaction.atomic
+def rebuild_cube(desde=None):
+    """Refaz o cubo (a partir da data `desde`, se informada). Retorna o número de células."""
+    cubo = SalesDailyCube.objects.all()
+    itens = SalesOrderItem.objects.filter(pedido__status__in=ACTIVE_ORDER_STATUSES)
+    if desde:
+        cubo = cubo.filter(data__gte=desde)
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        itens = itens.filter(pedido__criado_em__gte=inicio)
+    cubo.delete()
+    cells = defaultdict(lambda: [ZERO, ZERO, 0])
+    ultimo = {}
+    rows = itens.order_by("pedido_id").values_list(
+        "pedido_id", "pedido__criado_em", "pedido__cliente_id", "pedido__criado_por_id",
+        "produto_id", "quantidade", "preco_unitario",
+    )
+    for pedido_id, criado_em, cliente_id, vendedor_id, produto_id, qtd, preco in rows.iterator(chunk_size=5000):
+        cell = (timezone.localdate(criado_em), produto_id, cliente_id, vendedor_id)
+        c = cells[cell]
+        c[0] += Decimal(qtd or 0)
+        c[1] += item_total(qtd, preco)
+        if ultimo.get(cell) != pedido_id:
+            ultimo[cell] = pedido_id
+            c[2] += 1
+    SalesDailyCube.objects.bulk_create(
+        [SalesDailyCube(data=k[0], produto_id=k[1], cliente_id=k[2], vendedor_id=k[3],
+                        quantidade=q, valor_bruto=v, pedidos=n) for k, (q, v, n) in cells.items()],
+        batch_size=BATCH_SIZE,
+    )
+    return len(cells)
+
+
+# -----------------------------
+# Consultas
+# -----------------------------
+
+GROUPS = {
+    "produto": ["produto_id", "produto__sku", "produto__nome"],
+    "cliente": ["cliente_id", "cliente__nome"],
+    "vendedor": ["vendedor_id", "vendedor__username"],
+    "dia": ["data"],
+    "mes": ["mes"],
+}
+
+
+def sales_report(agrupar="produto", inicio=None, fim=None, **filtros):
+    """Vendas agregadas a partir do cubo. Padrão: últimos 12 meses.
+
+    `pedidos` soma as células: é exato por produto/dia e conta pares
+    pedido x produto nos demais agrupamentos.
+    """
+    fim = fim or timezone.localdate()
+    inicio = inicio or (fim - timedelta(days=365))
+    qs = SalesDailyCube.objects.filter(data__gte=inicio, data__lte=fim, **{k: v for k, v in filtros.items() if v})
+    if agrupar == "mes":
+        qs = qs.annotate(mes=TruncMonth("data"))
+    return (
+        qs.order_by().values(*GROUPS[agrupar])
+        .annotate(quantidade=Sum("quantidade"), valor_bruto=Sum("valor_bruto"), pedidos=Sum("pedidos"))
+        .order_by("-valor_bruto" if agrupar not in ("dia", "mes") else GROUPS[agrupar][0])
+    )
@@ -0,0 +1,23 @@
+"""Expiração de orçamentos vencidos (rascunho/enviado com validade no passado)."""
+import logging
+from django.utils import timezone
+from sales.models import Quote
+
+logger = logging.getLogger(__name__)
+
+EXPIRABLE = ("draft", "sent")
+
+
+def expire_overdue_quotes(today=None):
+    """Marca como expirados, num único UPDATE, os orçamentos vencidos. Retorna quantos mudaram.
+
+    O filtro de status vai no próprio UPDATE: um orçamento aprovado/convertido
+    por um usuário enquanto o job roda não é tocado.
+    """
+    today = today or timezone.localdate()
+    n = Quote.objects.filter(status__in=EXPIRABLE, validade__lt=today).update(
+        status="expired", atualizado_em=timezone.now(),
+    )
+    if n:
+        logger.info("%s orçamento(s) expirado(s) (validade anterior a %s)", n, today)
+    return n
@@ -1,5 +1,6 @@
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import inlineformset_factory, BaseInlineFormSet
+from core.widgets import Autocomplete
 from customers.models import Customer
 from .models import Quote, QuoteItem
 
@@ -20,7 +21,7 @@ class QuoteForm(forms.ModelForm):
         model = Quote
         fields = ["cliente","validade","desconto_total","observacoes","status"]
         widgets = {
-            "cliente": forms.Select(attrs={"class":"form-select"}),
+            "cliente": Autocomplete("sales:customer_search", label="{nome}", hint="{cpf_cnpj}", attrs={"class":"form-control"}),
             "validade": forms.DateInput(attrs={"class":"form-control","type":"date"}),
             "desconto_total": forms.NumberInput(attrs={"class":"form-control","step":"0.01"}),
             "observacoes": forms.Textarea(attrs={"class":"form-control","rows":3}),
@@ -32,13 +33,24 @@ class QuoteItemForm(forms.ModelForm):
         model = QuoteItem
         fields = ["produto","descricao","quantidade","preco_unitario"]
         widgets = {
-            "produto": forms.Select(attrs={"class":"form-select"}),
+            "produto": Autocomplete("inventory:products:search", label="{sku} - {nome}", hint="{ean}", attrs={"class":"form-control"}),
             "descricao": forms.TextInput(attrs={"class":"form-control","placeholder":"Descrição livre (se não selecionar produto)"}),
             "quantidade": forms.NumberInput(attrs={"class":"form-control","step":"0.01"}),
             "preco_unitario": forms.NumberInput(attrs={"class":"form-control","step":"0.01"}),
         }
 
-QuoteItemFormSet = inlineformset_factory(Quote, QuoteItem, form=QuoteItemForm, extra=1, can_delete=True)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.produto_id:
+            self.fields["produto"].widget.selected = (self.instance.produto_id, str(self.instance.produto))
+
+class BaseQuoteItemFormSet(BaseInlineFormSet):
+    def __init__(self, *args, **kwargs):
+        # Rótulo do produto de cada linha vem do select_related, sem consulta por linha
+        kwargs.setdefault("queryset", QuoteItem.objects.select_related("produto"))
+        super().__init__(*args, **kwargs)
+
+QuoteItemFormSet = inlineformset_factory(Quote, QuoteItem, form=QuoteItemForm, formset=BaseQuoteItemFormSet, extra=1, can_delete=True)
 
 
 class SalesOrderPaymentForm(forms.Form):
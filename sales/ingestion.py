@@ -0,0 +1,116 @@
+"""Ingestão de pedidos em lote (loja virtual / marketplaces).
+
+Recebe N pedidos já validados no formato (ver BatchOrderSerializer), resolve
+clientes e produtos com uma consulta por tipo, grava pedidos e itens com
+bulk_create numa única transação e aplica o estoque uma vez por produto.
+Pedidos inválidos são reportados e não impedem a gravação dos demais.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from customers.models import Customer
+from products.models import Product
+from inventory import valuation
+from inventory.stock_service import ACTIVE_ORDER_STATUSES, apply_stock_deltas
+from sales import cube
+from sales.models import SalesOrder, SalesOrderItem
+from sales.totals import item_total, ZERO
+
+BATCH_SIZE = 1000
+
+
+def _resolve(pedidos):
+    """Mapas {id/cpf_cnpj: cliente_id} e {id/sku: produto_id} numa consulta por modelo."""
+    cli_ids, docs, prod_ids, skus = set(), set(), set(), set()
+    for p in pedidos:
+        if p.get("cliente"):
+            cli_ids.add(p["cliente"])
+        elif p.get("cpf_cnpj"):
+            docs.add(p["cpf_cnpj"])
+        for i in p["itens"]:
+            if i.get("produto"):
+                prod_ids.add(i["produto"])
+            elif i.get("sku"):
+                skus.add(i["sku"])
+    # Listas vazias não chegam ao banco (pk__in=[] é resolvido pelo ORM)
+    clientes = {("id", pk): pk for pk in Customer.objects.filter(pk__in=cli_ids).values_list("pk", flat=True)}
+    clientes.update({("doc", doc): pk for pk, doc in Customer.objects.filter(cpf_cnpj__in=docs).values_list("pk", "cpf_cnpj")})
+    produtos = {("id", pk): pk for pk in Product.objects.filter(pk__in=prod_ids).values_list("pk", flat=True)}
+    produtos.update({("sku", sku): pk for pk, sku in Product.objects.filter(sku__in=skus).values_list("pk", "sku")})
+    return clientes, produtos
+
+
+def _validate(pedido, clientes, produtos):
+    """(cliente_id, [(item, produto_id)], erros)."""
+    erros = []
+    if pedido.get("cliente"):
+        cliente_id = clientes.get(("id", pedido["cliente"]))
+    else:
+        cliente_id = clientes.get(("doc", pedido.get("cpf_cnpj")))
+    if not cliente_id:
+        erros.append("Cliente não encontrado.")
+    itens = []
+    for n, item in enumerate(pedido["itens"], start=1):
+        produto_id = None
+        if item.get("produto"):
+            produto_id = produtos.get(("id", item["produto"]))
+        elif item.get("sku"):
+            produto_id = produtos.get(("sku", item["sku"]))
+        else:
+            if not item.get("descricao"):
+                erros.append(f"Item {n}: informe produto, sku ou descrição.")
+            itens.append((item, None))
+            continue
+        if not produto_id:
+            erros.append(f"Item {n}: produto não encontrado.")
+        itens.append((item, produto_id))
+    return cliente_id, itens, erros
+
+
+def ingest_orders(pedidos, *, user=None):
+    """Grava os pedidos válidos; retorna uma lista (na ordem recebida) de {"ref", "pedido", "erros"}."""
+    clientes, produtos = _resolve(pedidos)
+    resultados, orders, itens_por_order = [], [], []
+    agora = timezone.now()
+    for pedido in pedidos:
+        cliente_id, itens, erros = _validate(pedido, clientes, produtos)
+        res = {"ref": pedido.get("ref", ""), "pedido": None, "erros": erros}
+        resultados.append(res)
+        if erros:
+            continue
+        bruto = sum((item_total(i["quantidade"], i["preco_unitario"]) for i, _p in itens), ZERO)
+        desconto = pedido.get("desconto_total") or ZERO
+        status = pedido.get("status") or "confirmed"
+        orders.append((res, SalesOrder(
+            cliente_id=cliente_id,
+            status=status,
+            confirmado_em=agora if status in ACTIVE_ORDER_STATUSES else None,
+            desconto_total=desconto,
+            observacoes=pedido.get("observacoes", ""),
+            criado_por=user,
+            total_bruto=bruto,
+            total_liquido=bruto - desconto,
+            item_count=len(itens),
+        )))
+        itens_por_order.append(itens)
+    if not orders:
+        return resultados
+
+    with transaction.atomic():
+        SalesOrder.objects.bulk_create([o for _r, o in orders], batch_size=BATCH_SIZE)
+        novos, saidas = [], defaultdict(lambda: ZERO)
+        for (res, order), itens in zip(orders, itens_por_order):
+            res["pedido"] = order.pk
+            for item, produto_id in itens:
+                novos.append(SalesOrderItem(
+                    pedido_id=order.pk, produto_id=produto_id, descricao=item.get("descricao", ""),
+                    quantidade=item["quantidade"], preco_unitario=item["preco_unitario"],
+                ))
+                if produto_id and order.status in ACTIVE_ORDER_STATUSES:
+                    saidas[produto_id] += item["quantidade"]
+        SalesOrderItem.objects.bulk_create(novos, batch_size=BATCH_SIZE)
+        # bulk_create não dispara sinais: saída e valorização uma vez por produto
+        apply_stock_deltas({pid: -qtd for pid, qtd in saidas.items() if qtd})
+        valuation.register_outbounds(saidas.items())
+        cube.add_orders([o.pk for _r, o in orders])
+    return resultados
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from sales.expiration import expire_overdue_quotes
+
+class Command(BaseCommand):
+    help = "Marca como expirados os orçamentos em rascunho/enviados com validade vencida."
+
+    def handle(self, *args, **options):
+        n = expire_overdue_quotes()
+        self.stdout.write(self.style.SUCCESS(f"{n} orçamento(s) expirado(s)."))
@@ -0,0 +1,37 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from sales.cube import rebuild_cube
+from sales.models import SalesDailyCube
+
+class Command(BaseCommand):
+    help = "Reconstrói o cubo diário de vendas (SalesDailyCube) a partir dos itens de pedidos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Refaz apenas a partir desta data (AAAA-MM-DD).")
+
+    def _missing_constraints(self):
+        # Restrições que o migrate --run-syncdb não acrescenta em tabelas antigas
+        with connection.cursor() as cur:
+            existentes = set(connection.introspection.get_constraints(cur, SalesDailyCube._meta.db_table))
+        return [c for c in SalesDailyCube._meta.constraints if c.name not in existentes]
+
+    def handle(self, *args, **options):
+        desde = None
+        if options["desde"]:
+            try:
+                desde = date.fromisoformat(options["desde"])
+            except ValueError:
+                raise CommandError("Data inválida; use AAAA-MM-DD.")
+        faltando = self._missing_constraints()
+        if faltando and desde:
+            # Células repetidas podem estar antes de --desde; só a reconstrução completa as elimina
+            self.stdout.write("Cubo sem restrição de unicidade: reconstruindo desde o início.")
+            desde = None
+        n = rebuild_cube(desde)
+        if faltando:
+            with connection.schema_editor() as editor:
+                for constraint in faltando:
+                    editor.add_constraint(SalesDailyCube, constraint)
+                    self.stdout.write(f"Restrição criada: {constraint.name}")
+        self.stdout.write(self.style.SUCCESS(f"Cubo de vendas reconstruído: {n} células."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from sales.models import SalesOrder, Quote
+from sales.totals import find_totals_drift, repair_totals
+
+class Command(BaseCommand):
+    help = "Confere total_bruto/total_liquido/item_count gravados em pedidos e orçamentos com a soma dos itens."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Corrige as divergências encontradas.")
+        parser.add_argument("--show", type=int, default=20, help="Quantas divergências listar por modelo.")
+
+    def handle(self, *args, **options):
+        for model, nome in ((SalesOrder, "pedidos"), (Quote, "orçamentos")):
+            drift = find_totals_drift(model)
+            if not drift:
+                self.stdout.write(self.style.SUCCESS(f"{nome}: nenhuma divergência."))
+                continue
+            self.stdout.write(self.style.WARNING(f"{nome}: {len(drift)} divergentes."))
+            for pk, gravado, esperado in drift[:max(0, options["show"])]:
+                self.stdout.write(f"  #{pk}: gravado {gravado}, esperado {esperado} (bruto, líquido, itens)")
+            if options["fix"]:
+                self.stdout.write(self.style.SUCCESS(f"{nome}: {repair_totals(model, drift)} corrigidos."))
+        if not options["fix"]:
+            self.stdout.write("Use --fix para corrigir.")
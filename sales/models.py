@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from customers.models import Customer
 from products.models import Product
@@ -22,13 +23,20 @@ class Quote(models.Model):  # Orçamento
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
-    @property
-    def total_bruto(self):
-        return sum((i.subtotal for i in self.itens.all()), start=0)
-
-    @property
-    def total_liquido(self):
-        return self.total_bruto - (self.desconto_total or 0)
+    # Totais gravados, mantidos pelos sinais dos itens (ver sales/totals.py)
+    total_bruto = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    total_liquido = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        # paginação por cursor (criado_em, id), com e sem filtro de status
+        indexes = [
+            models.Index(fields=['-criado_em', '-id'], name='sales_quote_criado_id_idx'),
+            models.Index(fields=['status', '-criado_em', '-id'], name='sales_quote_st_criado_idx'),
+            models.Index(fields=['total_liquido'], name='sales_quote_total_idx'),
+            # job de expiração (status in draft/sent, validade < hoje)
+            models.Index(fields=['status', 'validade'], name='sales_quote_st_valid_idx'),
+        ]
 
     def __str__(self):
         return f"Orçamento #{self.id} - {self.cliente}"
@@ -58,14 +66,19 @@ class SalesOrder(models.Model):  # Pedido
     criado_por = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
+    # Última entrada em confirmed/invoiced: momento da saída de estoque na valorização
+    confirmado_em = models.DateTimeField(null=True, blank=True, editable=False)
 
-    @property
-    def total_bruto(self):
-        return sum((i.subtotal for i in self.itens.all()), start=0)
+    # Totais gravados, mantidos pelos sinais dos itens (ver sales/totals.py)
+    total_bruto = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    total_liquido = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
 
-    @property
-    def total_liquido(self):
-        return self.total_bruto - (self.desconto_total or 0)
+    class Meta:
+        indexes = [
+            models.Index(fields=['-criado_em', '-id'], name='sales_order_criado_id_idx'),
+            models.Index(fields=['total_liquido'], name='sales_order_total_idx'),
+        ]
 
     def __str__(self):
         return f"Pedido #{self.id} - {self.cliente} ({self.status})"
@@ -76,37 +89,41 @@ class SalesOrderItem(models.Model):
     descricao = models.CharField(max_length=200, blank=True)
     quantidade = models.DecimalField(max_digits=12, decimal_places=2, default=1)
     preco_unitario = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    criado_em = models.DateTimeField(auto_now_add=True, null=True)
 
     @property
     def subtotal(self):
         return (self.quantidade or 0) * (self.preco_unitario or 0)
 
-# === Vendas: sinais embutidos (não requer apps.ready) ===
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-
-def _recalc(p):
-    try:
-        from inventory.stock_service import recompute_product_stock
-        recompute_product_stock(p)
-    except Exception:
-        pass
-
-@receiver([post_save, post_delete], sender=SalesOrderItem)
-def _sales_item_changed(sender, instance, **kwargs):
-    try:
-        if instance and instance.produto_id:
-            _recalc(instance.produto)
-    except Exception:
-        pass
-
-@receiver(post_save, sender=SalesOrder)
-def _sales_order_changed(sender, instance, **kwargs):
-    # Ao salvar/mudar status do pedido, recalcula os produtos dos itens
-    try:
-        for it in instance.itens.all():
-            if it.produto_id:
-                _recalc(it.produto)
-    except Exception:
-        pass
-# === Fim dos sinais embutidos ===
+class SalesDailyCube(models.Model):
+    """Vendas agregadas por dia, produto, cliente e vendedor (pedidos confirmed/invoiced).
+
+    Mantido pelos sinais de pedidos/itens (ver sales/cube.py); `pedidos` conta
+    os pedidos distintos da célula (única por data/produto/cliente/vendedor).
+    Reconstrução: comando rebuild_sales_cube.
+    """
+    data = models.DateField()
+    produto = models.ForeignKey(Product, null=True, blank=True, on_delete=models.CASCADE, related_name="+")
+    cliente = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="+")
+    vendedor = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    quantidade = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    valor_bruto = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    pedidos = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data', 'cliente'], name='sales_cube_data_cli_idx'),
+            models.Index(fields=['produto', 'data'], name='sales_cube_prod_data_idx'),
+            models.Index(fields=['vendedor', 'data'], name='sales_cube_vend_data_idx'),
+        ]
+        constraints = [
+            # Uma linha por célula; Coalesce porque NULLs não colidem em índices únicos
+            models.UniqueConstraint(
+                "data", Coalesce("produto", 0), "cliente", Coalesce("vendedor", 0), name="sales_cube_cell_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y} {self.produto_id}/{self.cliente_id}/{self.vendedor_id}: {self.valor_bruto}"
+
+# Sinais de estoque: ver sales/signals.py (registrados em SalesConfig.ready)
@@ -1,5 +1,6 @@
+from decimal import Decimal
 from rest_framework import serializers
-from .models import SalesOrder, SalesOrderItem
+from .models import SalesOrder, SalesOrderItem, Quote, QuoteItem
 
 class SalesOrderItemSerializer(serializers.ModelSerializer):
     subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -9,9 +10,74 @@ class SalesOrderItemSerializer(serializers.ModelSerializer):
 
 class SalesOrderSerializer(serializers.ModelSerializer):
     itens = SalesOrderItemSerializer(many=True, read_only=True)
-    total_bruto = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
-    total_liquido = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = SalesOrder
         fields = "__all__"
+        read_only_fields = ["total_bruto","total_liquido","item_count"]
+
+class QuoteItemSerializer(serializers.ModelSerializer):
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    class Meta:
+        model = QuoteItem
+        fields = ["id","orcamento","produto","descricao","quantidade","preco_unitario","subtotal"]
+
+class QuoteSerializer(serializers.ModelSerializer):
+    itens = QuoteItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Quote
+        fields = "__all__"
+        read_only_fields = ["status","pedido","total_bruto","total_liquido","item_count"]
+
+class QuoteApproveSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000, required=False)
+    gerar_cr = serializers.BooleanField(default=False)
+    parcelas = serializers.IntegerField(min_value=1, default=1)
+    primeiro_vencimento = serializers.DateField(required=False, allow_null=True, default=None)
+    intervalo_dias = serializers.IntegerField(min_value=1, default=30)
+    meio_pagamento = serializers.CharField(required=False, allow_blank=True, default="")
+
+class BatchOrderItemSerializer(serializers.Serializer):
+    produto = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    sku = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    descricao = serializers.CharField(max_length=200, required=False, allow_blank=True, default="")
+    quantidade = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.01"))
+    preco_unitario = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0"))
+
+class BatchOrderSerializer(serializers.Serializer):
+    ref = serializers.CharField(max_length=100, required=False, allow_blank=True, default="")
+    cliente = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    cpf_cnpj = serializers.CharField(max_length=18, required=False, allow_blank=True)
+    status = serializers.ChoiceField(choices=SalesOrder.STATUS, default="confirmed")
+    desconto_total = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0"), default=Decimal("0"))
+    observacoes = serializers.CharField(required=False, allow_blank=True, default="")
+    itens = BatchOrderItemSerializer(many=True, allow_empty=False)
+
+    def validate(self, attrs):
+        if not attrs.get("cliente") and not attrs.get("cpf_cnpj"):
+            raise serializers.ValidationError("Informe cliente ou cpf_cnpj.")
+        return attrs
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    agrupar = serializers.ChoiceField(choices=["produto","cliente","vendedor","dia","mes"], default="produto")
+    inicio = serializers.DateField(required=False)
+    fim = serializers.DateField(required=False)
+    produto = serializers.IntegerField(required=False)
+    cliente = serializers.IntegerField(required=False)
+    vendedor = serializers.IntegerField(required=False)
+
+class SalesReportRowSerializer(serializers.Serializer):
+    # Só os campos do agrupamento pedido vêm na linha; os demais são omitidos
+    produto_id = serializers.IntegerField(required=False)
+    produto__sku = serializers.CharField(required=False)
+    produto__nome = serializers.CharField(required=False)
+    cliente_id = serializers.IntegerField(required=False)
+    cliente__nome = serializers.CharField(required=False)
+    vendedor_id = serializers.IntegerField(required=False)
+    vendedor__username = serializers.CharField(required=False)
+    data = serializers.DateField(required=False)
+    mes = serializers.DateField(required=False)
+    quantidade = serializers.DecimalField(max_digits=16, decimal_places=2)
+    valor_bruto = serializers.DecimalField(max_digits=16, decimal_places=2)
+    pedidos = serializers.IntegerField()
@@ -1,24 +1,310 @@
-from django.db.models.signals import post_save, post_delete
+import logging
+from collections import defaultdict
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Min
 from django.dispatch import receiver
-from sales.models import SalesOrderItem, SalesOrder
-from inventory.stock_service import recompute_product_stock
+from django.utils import timezone
+from sales.models import SalesOrderItem, SalesOrder, Quote, QuoteItem
+from sales import totals, cube
+from inventory.stock_service import (
+    ACTIVE_ORDER_STATUSES, sale_contribution, apply_contribution_change, apply_stock_deltas,
+    order_status_deltas, invalidate_checkpoints, _to_decimal,
+)
+from inventory.stock_collector import mark_dirty, is_collecting, pending_batch, recompute_products
+from inventory import valuation
 
-@receiver([post_save, post_delete], sender=SalesOrderItem)
-def _sales_item_changed(sender, instance, **kwargs):
-    # Itens de pedido afetam o estoque quando o pedido está confirmado/invoiced.
+logger = logging.getLogger(__name__)
+
+def _valuation(fn, *args):
+    # Valorização nunca quebra o save; divergências são refeitas com rebuild_valuation
     try:
-        if instance and instance.produto_id:
-            recompute_product_stock(instance.produto)
+        fn(*args)
     except Exception:
-        pass
+        logger.exception("Falha ao atualizar a valorização do estoque (%s)", args)
+
+def _cube(fn, *args):
+    # Idem para o cubo de vendas; divergências: rebuild_sales_cube
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception("Falha ao atualizar o cubo de vendas (%s)", args)
+
+def _order_product_ids(order_id):
+    return set(SalesOrderItem.objects.filter(pedido_id=order_id).values_list("produto_id", flat=True))
+
+def _order_row(order_id):
+    # (status, criado_em, cliente_id, criado_por_id): o que estoque e cubo precisam do pedido
+    return SalesOrder.objects.filter(pk=order_id).values_list(
+        "status", "criado_em", "cliente_id", "criado_por_id").first() or (None, None, None, None)
+
+# -----------------------------
+# Lote (coalesce_stock): efeitos adiados por documento
+# -----------------------------
+
+class _OrderBatch:
+    """O que os sinais de pedidos/itens adiam dentro de `coalesce_stock()`.
+
+    Totais e cubo são refeitos uma vez por pedido, estoque e valorização uma
+    vez por produto, e os checkpoints num único DELETE, no commit.
+    """
+    def __init__(self, using, handler):
+        self.using = using
+        self.handler = handler
+        self.pedidos = set()        # totais e cubo a refazer
+        self.antes = defaultdict(lambda: [cube.ZERO, cube.ZERO, 0])  # contribuição deles no cubo antes do lote
+        self.produtos = set()       # estoque a recalcular
+        self.stale = set()          # valorização a refazer (replay)
+        self.novos = []             # (pedido_id, produto_id, quantidade) de itens criados
+        self.checkpoint_item = None # menor item alterado/excluído
+        self.checkpoint_produtos = set()
 
-@receiver(post_save, sender=SalesOrder)
-def _sales_order_changed(sender, instance, **kwargs):
-    # Ao salvar o pedido (ex.: mudar status), recalcule os produtos do pedido
+    def touch(self, *order_ids):
+        """Guarda a contribuição no cubo de cada pedido na primeira vez que ele é tocado."""
+        novos = {pk for pk in order_ids if pk} - self.pedidos
+        if not novos:
+            return
+        self.pedidos |= novos
+        for k, (q, v, n) in cube.orders_snapshot(novos).items():
+            c = self.antes[k]
+            c[0] += q
+            c[1] += v
+            c[2] += n
+
+    def invalidate(self, product_ids, item_id):
+        self.checkpoint_produtos.update(pid for pid in product_ids if pid)
+        if item_id and (self.checkpoint_item is None or item_id < self.checkpoint_item):
+            self.checkpoint_item = item_id
+
+    def flush(self):
+        self.handler(self)
+
+
+def _flush_order_batch(batch):
+    if batch.checkpoint_produtos:
+        invalidate_checkpoints(batch.checkpoint_produtos, item_id=batch.checkpoint_item)
     try:
-        from sales.models import SalesOrderItem
-        for it in SalesOrderItem.objects.filter(pedido=instance).select_related("produto"):
-            if it.produto_id:
-                recompute_product_stock(it.produto)
+        recompute_products(batch.produtos, using=batch.using)
     except Exception:
-        pass
+        logger.exception("Falha ao atualizar estoque (%s produtos); rode audit_stock --fix", len(batch.produtos))
+    if batch.novos:
+        ativos = set(SalesOrder.objects.filter(
+            pk__in={pedido_id for pedido_id, _p, _q in batch.novos}, status__in=ACTIVE_ORDER_STATUSES,
+        ).values_list("pk", flat=True))
+        saidas = [(produto_id, qtd) for pedido_id, produto_id, qtd in batch.novos
+                  if pedido_id in ativos and produto_id not in batch.stale]
+        _valuation(valuation.register_outbounds, saidas)
+    if batch.stale:
+        _valuation(valuation.mark_stale, *batch.stale)
+    if batch.pedidos:
+        totals.refresh_totals(SalesOrder, batch.pedidos)
+        _cube(cube.apply_orders_diff, batch.pedidos, batch.antes)
+
+
+def _order_batch():
+    """Lote da transação corrente; None se ela não passou por `coalesce_stock()`.
+
+    O lote é aberto dentro do bloco, mas vale até o commit da transação
+    externa: o que for gravado depois do bloco também entra nele, senão o
+    commit contaria de novo o que o caminho por item já aplicou.
+    """
+    return pending_batch(_flush_order_batch, _OrderBatch, create=is_collecting())
+
+@receiver(pre_save, sender=SalesOrderItem, dispatch_uid="sales_item_pre_save")
+def _sales_item_snapshot(sender, instance, raw=False, **kwargs):
+    # Itens de pedido afetam o estoque quando o pedido está confirmed/invoiced.
+    instance._stock_prev = instance._total_prev = instance._cube_prev = None
+    if raw:
+        return
+    batch = _order_batch()
+    if not instance.pk:
+        if batch is not None:
+            batch.touch(instance.pedido_id)
+        return
+    row = (
+        SalesOrderItem.objects.filter(pk=instance.pk)
+        .values_list("produto_id", "pedido__status", "quantidade", "pedido_id", "preco_unitario",
+                     "pedido__criado_em", "pedido__cliente_id", "pedido__criado_por_id")
+        .first()
+    )
+    if row:
+        instance._stock_prev = (row[0], sale_contribution(row[1], row[2]))
+        instance._total_prev = (row[3], totals.item_total(row[2], row[4]))
+        key = cube.order_key(row[1], row[5], row[6], row[7])
+        instance._cube_prev = cube.item_snapshot(row[3], row[0], row[2], row[4], key)
+    if batch is not None:
+        batch.touch(instance.pedido_id, row[3] if row else None)
+
+@receiver(post_save, sender=SalesOrderItem, dispatch_uid="sales_item_post_save")
+def _sales_item_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, "_stock_prev", None)
+    batch = _order_batch()
+    if batch is not None:
+        # Em lote: totais e cubo por pedido, estoque e valorização por produto, no commit
+        batch.produtos.update((instance.produto_id, old[0] if old else None))
+        if old:
+            novo = -_to_decimal(instance.quantidade) if old[1] else Decimal('0')
+            if old != (instance.produto_id, novo):
+                batch.invalidate({old[0], instance.produto_id}, instance.pk)
+                batch.stale.update((old[0], instance.produto_id))
+        elif created:
+            batch.novos.append((instance.pedido_id, instance.produto_id, instance.quantidade))
+        return
+    totals.apply_item_change(
+        SalesOrder, getattr(instance, "_total_prev", None),
+        (instance.pedido_id, totals.item_total(instance.quantidade, instance.preco_unitario)),
+    )
+    pedido = _order_row(instance.pedido_id)
+    _cube(cube.item_changed, getattr(instance, "_cube_prev", None), cube.item_snapshot(
+        instance.pedido_id, instance.produto_id, instance.quantidade, instance.preco_unitario, cube.order_key(*pedido)))
+    new = (instance.produto_id, sale_contribution(pedido[0], instance.quantidade))
+    if old and old != new:
+        # Linha já coberta por checkpoint mudou: o checkpoint deixa de valer
+        invalidate_checkpoints({old[0], new[0]}, item_id=instance.pk)
+        _valuation(valuation.mark_stale, old[0], new[0])
+    elif created and new[1]:
+        _valuation(valuation.register_outbound, new[0], -new[1])
+    try:
+        apply_contribution_change(old, new)
+    except Exception:
+        try:
+            mark_dirty(instance.produto_id, old[0] if old else None)
+        except Exception:
+            logger.exception("Falha ao atualizar estoque (%s #%s); rode audit_stock --fix", sender.__name__, instance.pk)
+
+@receiver(pre_delete, sender=SalesOrderItem, dispatch_uid="sales_item_pre_delete")
+def _sales_item_delete_snapshot(sender, instance, **kwargs):
+    # O pedido ainda existe aqui (mesmo em delete em cascata)
+    instance._stock_prev = instance._cube_prev = None
+    batch = _order_batch()
+    if batch is not None:
+        batch.touch(instance.pedido_id)
+        return
+    pedido = _order_row(instance.pedido_id)
+    instance._cube_prev = cube.item_snapshot(
+        instance.pedido_id, instance.produto_id, instance.quantidade, instance.preco_unitario, cube.order_key(*pedido))
+    if instance.produto_id:
+        instance._stock_prev = (instance.produto_id, sale_contribution(pedido[0], instance.quantidade))
+
+@receiver(post_delete, sender=SalesOrderItem, dispatch_uid="sales_item_post_delete")
+def _sales_item_deleted(sender, instance, **kwargs):
+    batch = _order_batch()
+    if batch is not None:
+        batch.produtos.add(instance.produto_id)
+        batch.stale.add(instance.produto_id)
+        batch.invalidate([instance.produto_id], instance.pk)
+        return
+    totals.apply_item_change(SalesOrder, (instance.pedido_id, totals.item_total(instance.quantidade, instance.preco_unitario)), None)
+    _cube(cube.item_changed, getattr(instance, "_cube_prev", None), None)
+    invalidate_checkpoints([instance.produto_id], item_id=instance.pk)
+    old = getattr(instance, "_stock_prev", None)
+    if old is None or old[1]:
+        _valuation(valuation.mark_stale, instance.produto_id)
+    try:
+        apply_contribution_change(getattr(instance, "_stock_prev", None), None)
+    except Exception:
+        try:
+            mark_dirty(instance.produto_id)
+        except Exception:
+            logger.exception("Falha ao atualizar estoque (%s #%s); rode audit_stock --fix", sender.__name__, instance.pk)
+
+@receiver(pre_save, sender=SalesOrder, dispatch_uid="sales_order_pre_save")
+def _sales_order_snapshot(sender, instance, raw=False, **kwargs):
+    instance._status_prev = instance._cube_prev = None
+    if raw:
+        return
+    if not instance.pk and instance.status in ACTIVE_ORDER_STATUSES and not instance.confirmado_em:
+        instance.confirmado_em = timezone.now()
+    if instance.pk:
+        row = _order_row(instance.pk)
+        instance._status_prev = row[0]
+        instance._cube_prev = cube.order_key(*row)
+        batch = _order_batch()
+        if batch is not None:
+            batch.touch(instance.pk)
+    totals.load_stored_totals(instance)
+
+@receiver(post_save, sender=SalesOrder, dispatch_uid="sales_order_cube")
+def _sales_order_cube(sender, instance, created=False, raw=False, **kwargs):
+    # Status, data, cliente ou vendedor mudaram: a contribuição troca de célula
+    if raw or created or _order_batch() is not None:
+        return  # em lote: o pedido foi guardado no pre_save e é refeito no commit
+    new_key = cube.order_key(instance.status, instance.criado_em, instance.cliente_id, instance.criado_por_id)
+    _cube(cube.order_changed, instance.pk, getattr(instance, "_cube_prev", None), new_key)
+
+@receiver(post_save, sender=SalesOrder, dispatch_uid="sales_order_post_save")
+def _sales_order_changed(sender, instance, created=False, raw=False, **kwargs):
+    # Só a mudança de status entre "baixa estoque" e "não baixa" mexe no saldo
+    if raw or created:
+        return
+    old_status = getattr(instance, "_status_prev", None)
+    if (old_status in ACTIVE_ORDER_STATUSES) == (instance.status in ACTIVE_ORDER_STATUSES):
+        return
+    if instance.status in ACTIVE_ORDER_STATUSES:
+        # Data da saída usada pelo replay da valorização (vale também com update_fields)
+        instance.confirmado_em = timezone.now()
+        SalesOrder.objects.filter(pk=instance.pk).update(confirmado_em=instance.confirmado_em)
+    primeiro = SalesOrderItem.objects.filter(pedido=instance).aggregate(m=Min("id"))["m"]
+    batch = _order_batch()
+    if batch is not None:
+        # Em lote a valorização é refeita (replay): itens novos do pedido não contam duas vezes
+        produtos = _order_product_ids(instance.pk)
+        if primeiro:
+            batch.invalidate(produtos, primeiro)
+        batch.produtos |= produtos
+        batch.stale |= produtos
+        return
+    if primeiro:
+        invalidate_checkpoints(_order_product_ids(instance.pk), item_id=primeiro)
+    if instance.status in ACTIVE_ORDER_STATUSES:
+        # Pedido passou a baixar estoque: saída ao custo médio, por produto
+        for produto_id, delta in order_status_deltas(instance.pk, old_status, instance.status).items():
+            _valuation(valuation.register_outbound, produto_id, -delta)
+    else:
+        _valuation(valuation.mark_stale, *_order_product_ids(instance.pk))
+    try:
+        apply_stock_deltas(order_status_deltas(instance.pk, old_status, instance.status))
+    except Exception:
+        try:
+            mark_dirty(*_order_product_ids(instance.pk))
+        except Exception:
+            logger.exception("Falha ao atualizar estoque (%s #%s); rode audit_stock --fix", sender.__name__, instance.pk)
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid="sales_cube_seller_pre_delete")
+def _seller_deleted(sender, instance, **kwargs):
+    # Antes do SET_NULL: junta as células do vendedor às células sem vendedor
+    _cube(cube.merge_seller_cells, instance.pk)
+
+# -----------------------------
+# Totais gravados de orçamentos
+# -----------------------------
+
+@receiver(pre_save, sender=Quote, dispatch_uid="sales_quote_pre_save")
+def _quote_totals(sender, instance, raw=False, **kwargs):
+    if not raw:
+        totals.load_stored_totals(instance)
+
+@receiver(pre_save, sender=QuoteItem, dispatch_uid="sales_quote_item_pre_save")
+def _quote_item_snapshot(sender, instance, raw=False, **kwargs):
+    instance._total_prev = None
+    if raw or not instance.pk:
+        return
+    row = QuoteItem.objects.filter(pk=instance.pk).values_list("orcamento_id", "quantidade", "preco_unitario").first()
+    if row:
+        instance._total_prev = (row[0], totals.item_total(row[1], row[2]))
+
+@receiver(post_save, sender=QuoteItem, dispatch_uid="sales_quote_item_post_save")
+def _quote_item_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    totals.apply_item_change(
+        Quote, getattr(instance, "_total_prev", None),
+        (instance.orcamento_id, totals.item_total(instance.quantidade, instance.preco_unitario)),
+    )
+
+@receiver(post_delete, sender=QuoteItem, dispatch_uid="sales_quote_item_post_delete")
+def _quote_item_deleted(sender, instance, **kwargs):
+    totals.apply_item_change(Quote, (instance.orcamento_id, totals.item_total(instance.quantidade, instance.preco_unitario)), None)
@@ -0,0 +1,7 @@
+from celery import shared_task
+from sales.expiration import expire_overdue_quotes
+
+@shared_task
+def expire_quotes():
+    """Agendar diariamente (celery beat) ou usar o comando expire_quotes."""
+    return expire_overdue_quotes()
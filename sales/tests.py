@@ -0,0 +1,122 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from customers.models import Customer
+from products.models import Product
+from inventory.models import StockMovement
+from inventory.stock_collector import coalesce_stock
+from sales import cube, totals
+from sales.models import SalesDailyCube, SalesOrder, SalesOrderItem
+
+# sessão + usuário + pedidos + itens (prefetch)
+LIST_QUERIES = 4
+
+
+class SalesOrderViewSetQueriesTest(TestCase):
+    """A listagem de pedidos não pode crescer em consultas com o número de pedidos (N+1)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        cls.cliente = Customer.objects.create(nome="Cliente Teste", cpf_cnpj="00000000000")
+        cls.produtos = [Product.objects.create(sku=f"TST-{i}", nome=f"Produto {i}") for i in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _criar_pedidos(self, n):
+        for _ in range(n):
+            pedido = SalesOrder.objects.create(cliente=self.cliente, criado_por=self.user, status="draft")
+            for produto in self.produtos:
+                SalesOrderItem.objects.create(pedido=pedido, produto=produto, quantidade=1, preco_unitario=Decimal("2.50"))
+
+    def _listar(self):
+        response = self.client.get(reverse("salesorder-list"))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list_query_count_does_not_grow_with_orders(self):
+        self._criar_pedidos(5)
+        with self.assertNumQueries(LIST_QUERIES):
+            pedidos = self._listar()
+        self.assertEqual(len(pedidos), 5)
+
+        self._criar_pedidos(40)
+        with self.assertNumQueries(LIST_QUERIES):
+            pedidos = self._listar()
+        self.assertEqual(len(pedidos), 45)
+        self.assertTrue(all(len(p["itens"]) == 3 for p in pedidos))
+
+
+class CoalesceStockOrderBatchTest(TransactionTestCase):
+    """Sinais de pedidos/itens dentro de coalesce_stock() adiam o trabalho para o commit (lote)."""
+
+    def setUp(self):
+        self.cliente = Customer.objects.create(nome="Cliente Teste", cpf_cnpj="00000000000")
+        self.produto = Product.objects.create(sku="TST-1", nome="Produto 1")
+        StockMovement.objects.create(produto=self.produto, tipo="IN", quantidade=100, custo_unitario=Decimal("4.00"))
+        self.pedido = SalesOrder.objects.create(cliente=self.cliente, status="confirmed")
+
+    def _cubo(self):
+        return list(SalesDailyCube.objects.values_list("quantidade", "valor_bruto", "pedidos"))
+
+    def _item(self, quantidade):
+        return SalesOrderItem.objects.create(pedido=self.pedido, produto=self.produto, quantidade=quantidade,
+                                             preco_unitario=Decimal("10.00"))
+
+    def _assert_consistente(self):
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_atual, Decimal("97"))
+        self.assertEqual(totals.find_totals_drift(SalesOrder), [])
+        self.assertEqual(self.produto.valuation.quantidade, Decimal("97"))
+        self.assertEqual(self.produto.valuation.cmv_acumulado, Decimal("12.00"))
+        incremental = self._cubo()
+        cube.rebuild_cube()
+        self.assertEqual(incremental, self._cubo())
+
+    def test_items_saved_inside_block(self):
+        with coalesce_stock():
+            self._item(1)
+            self._item(2)
+        self.assertEqual(self._cubo(), [(Decimal("3.00"), Decimal("30.00"), 1)])
+        self._assert_consistente()
+
+    def test_items_saved_after_block_in_outer_transaction(self):
+        # O lote vale até o commit externo: o item gravado depois do bloco não pode contar duas vezes
+        with transaction.atomic():
+            with coalesce_stock():
+                self._item(1)
+            self._item(2)
+        self.assertEqual(self._cubo(), [(Decimal("3.00"), Decimal("30.00"), 1)])
+        self._assert_consistente()
+
+
+class SalesCubeSellerDeleteTest(TestCase):
+    """Excluir um vendedor junta suas células às sem vendedor, sem duplicar células."""
+
+    def setUp(self):
+        self.cliente = Customer.objects.create(nome="Cliente Teste", cpf_cnpj="00000000000")
+        self.produto = Product.objects.create(sku="TST-1", nome="Produto 1")
+        self.vendedor = User.objects.create_user("vendedor")
+        for criado_por, quantidade in ((self.vendedor, 2), (None, 3)):
+            pedido = SalesOrder.objects.create(cliente=self.cliente, criado_por=criado_por, status="confirmed")
+            SalesOrderItem.objects.create(pedido=pedido, produto=self.produto, quantidade=quantidade,
+                                          preco_unitario=Decimal("10.00"))
+
+    def _cubo(self):
+        return list(SalesDailyCube.objects.order_by("id").values_list("vendedor_id", "quantidade", "valor_bruto", "pedidos"))
+
+    def test_delete_seller_merges_cells(self):
+        self.assertEqual(SalesDailyCube.objects.count(), 2)
+        self.vendedor.delete()
+        incremental = self._cubo()
+        self.assertEqual(incremental, [(None, Decimal("5.00"), Decimal("50.00"), 2)])
+        cube.rebuild_cube()
+        self.assertEqual(self._cubo(), incremental)
+
+    def test_cell_is_unique_without_seller(self):
+        cell = SalesDailyCube.objects.get(vendedor__isnull=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SalesDailyCube.objects.create(data=cell.data, produto=self.produto, cliente=self.cliente, pedidos=1)
@@ -0,0 +1,111 @@
+"""Totais gravados de pedidos e orçamentos (total_bruto, total_liquido, item_count).
+
+Cada item contribui com `item_total` (quantidade x preço, arredondado ao
+centavo). Os sinais aplicam a diferença de cada item com um UPDATE por F();
+o save do documento relê os totais do banco e recalcula o líquido a partir
+do desconto. Caminhos em lote (bulk_create) chamam `refresh_totals`.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from inventory.stock_service import _to_decimal
+
+CENT = Decimal('0.01')
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Decimal('0.00')
+
+
+def item_total(quantidade, preco_unitario):
+    return (_to_decimal(quantidade) * _to_decimal(preco_unitario)).quantize(CENT, ROUND_HALF_UP)
+
+
+def _item_fk(model):
+    return model._meta.get_field('itens').field.name
+
+
+def apply_item_delta(model, doc_id, valor, itens=0):
+    """Soma `valor` ao bruto/líquido e `itens` à contagem do documento."""
+    valor = _to_decimal(valor)
+    if not doc_id or (not valor and not itens):
+        return
+    model.objects.filter(pk=doc_id).update(
+        total_bruto=F('total_bruto') + Value(valor, output_field=MONEY),
+        total_liquido=F('total_liquido') + Value(valor, output_field=MONEY),
+        item_count=F('item_count') + itens,
+    )
+
+
+def apply_item_change(model, old, new):
+    """`old`/`new` são (doc_id, item_total) ou None (item inexistente)."""
+    if old == new:
+        return
+    if old and new and old[0] == new[0]:
+        apply_item_delta(model, new[0], new[1] - old[1])
+        return
+    if old:
+        apply_item_delta(model, old[0], -old[1], -1)
+    if new:
+        apply_item_delta(model, new[0], new[1], 1)
+
+
+def load_stored_totals(instance):
+    """Antes do save do documento: totais atuais do banco e líquido pelo desconto.
+
+    Evita que uma instância em memória sobrescreva o que os itens já somaram.
+    """
+    row = None
+    if instance.pk:
+        row = type(instance).objects.filter(pk=instance.pk).values_list('total_bruto', 'item_count').first()
+    if row:
+        instance.total_bruto, instance.item_count = _to_decimal(row[0]), row[1]
+    else:
+        instance.total_bruto, instance.item_count = ZERO, 0
+    instance.total_liquido = _to_decimal(instance.total_bruto) - _to_decimal(instance.desconto_total)
+
+
+def expected_totals(model, doc_ids):
+    """{doc_id: (total_bruto, item_count)} somando os itens dos documentos informados."""
+    fk = _item_fk(model)
+    item_model = model._meta.get_field('itens').related_model
+    totais = {pk: [ZERO, 0] for pk in doc_ids}
+    rows = item_model.objects.filter(**{f"{fk}_id__in": list(doc_ids)}).values_list(f"{fk}_id", 'quantidade', 'preco_unitario')
+    for doc_id, qtd, preco in rows.iterator():
+        t = totais[doc_id]
+        t[0] += item_total(qtd, preco)
+        t[1] += 1
+    return {pk: (t[0], t[1]) for pk, t in totais.items()}
+
+
+def find_totals_drift(model, chunk_size=1000):
+    """[(pk, gravado, esperado)] com (total_bruto, total_liquido, item_count) divergentes."""
+    drift = []
+    ids = list(model.objects.order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(ids), chunk_size):
+        chunk = ids[i:i + chunk_size]
+        esperado = expected_totals(model, chunk)
+        for pk, bruto, liquido, count, desconto in model.objects.filter(pk__in=chunk).values_list(
+                'pk', 'total_bruto', 'total_liquido', 'item_count', 'desconto_total'):
+            e_bruto, e_count = esperado[pk]
+            gravado = (_to_decimal(bruto), _to_decimal(liquido), count)
+            certo = (e_bruto, e_bruto - _to_decimal(desconto), e_count)
+            if gravado != certo:
+                drift.append((pk, gravado, certo))
+    return drift
+
+
+@transaction.atomic
+def repair_totals(model, drift, chunk_size=500):
+    objs = [model(pk=pk, total_bruto=e[0], total_liquido=e[1], item_count=e[2]) for pk, _g, e in drift]
+    model.objects.bulk_update(objs, ['total_bruto', 'total_liquido', 'item_count'], batch_size=chunk_size)
+    return len(objs)
+
+
+def refresh_totals(model, doc_ids):
+    """Recalcula os totais dos documentos a partir dos itens (após bulk_create/update)."""
+    ids = {pk for pk in doc_ids if pk}
+    if not ids:
+        return 0
+    esperado = expected_totals(model, ids)
+    descontos = dict(model.objects.filter(pk__in=ids).values_list('pk', 'desconto_total'))
+    drift = [(pk, None, (b, b - _to_decimal(descontos.get(pk)), n)) for pk, (b, n) in esperado.items() if pk in descontos]
+    return repair_totals(model, drift)
@@ -14,6 +14,7 @@ urlpatterns = [
     path("clientes/", views.CustomerListView.as_view(), name="customers"),
     path("clientes/novo/", views.CustomerCreateView.as_view(), name="customer_new"),
     path("clientes/<int:pk>/editar/", views.CustomerUpdateView.as_view(), name="customer_edit"),
+    path("clientes/buscar/", views.CustomerTypeaheadView.as_view(), name="customer_search"),
 
     # Orçamentos
     path("orcamentos/", views.QuoteListView.as_view(), name="quotes"),
@@ -1,10 +1,12 @@
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import redirect, get_object_or_404, render
 from django.urls import reverse_lazy
 from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DetailView, View
 from core.utils import has_module
+from core.pagination import KeysetPaginationMixin
 from customers.models import Customer
 from .models import Quote, QuoteItem, SalesOrder, SalesOrderItem
 from .forms import CustomerForm, QuoteForm, QuoteItemFormSet
@@ -24,11 +26,18 @@ class CustomerListView(VendasRequiredMixin, ListView):
     paginate_by = 25
 
     def get_queryset(self):
-        qs = Customer.objects.all().order_by("nome")
-        q = self.request.GET.get("q")
-        if q:
-            qs = qs.filter(nome__icontains=q) | qs.filter(razao_social__icontains=q) | qs.filter(email__icontains=q) | qs.filter(cpf_cnpj__icontains=q)
-        return qs
+        from customers.search import search_customers
+        return search_customers(Customer.objects.all().order_by("nome"), self.request.GET.get("q"))
+
+class CustomerTypeaheadView(VendasRequiredMixin, View):
+    """JSON para o autocomplete de cliente: ?q=texto&limit=10 (busca FTS, só ativos)."""
+    def get(self, request):
+        from customers.search import typeahead
+        try:
+            limit = min(max(int(request.GET.get("limit", 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        return JsonResponse({"results": typeahead(request.GET.get("q", ""), limit)})
 
 class CustomerCreateView(VendasRequiredMixin, CreateView):
     model = Customer
@@ -43,13 +52,13 @@ class CustomerUpdateView(VendasRequiredMixin, UpdateView):
     success_url = reverse_lazy("sales:customers")
 
 # ---- Orçamentos ----
-class QuoteListView(VendasRequiredMixin, ListView):
+class QuoteListView(VendasRequiredMixin, KeysetPaginationMixin, ListView):
     model = Quote
     template_name = "sales/quotes_list.html"
     paginate_by = 25
 
     def get_queryset(self):
-        qs = Quote.objects.select_related("cliente").all().order_by("-criado_em")
+        qs = Quote.objects.select_related("cliente").all()
         status = self.request.GET.get("status")
         if status:
             qs = qs.filter(status=status)
@@ -104,40 +113,27 @@ class QuoteDetailView(VendasRequiredMixin, DetailView):
 
 class QuoteApproveView(VendasRequiredMixin, View):
     def post(self, request, pk):
+        from .conversion import convert_quote
         quote = get_object_or_404(Quote, pk=pk)
-        if quote.status == "approved" and quote.pedido_id:
+        res = convert_quote(quote.pk, user=request.user)
+        if res["erro"]:
+            messages.error(request, res["erro"])
+            return redirect("sales:quote_detail", pk=quote.pk)
+        if not res["criado"]:
             messages.info(request, "Este orçamento já foi aprovado.")
-            return redirect("sales:order_detail", pk=quote.pedido_id)
-        with transaction.atomic():
-            order = SalesOrder.objects.create(
-                cliente=quote.cliente,
-                desconto_total=quote.desconto_total,
-                observacoes=f"Convertido do Orçamento #{quote.id}",
-                criado_por=request.user,
-                status="confirmed",
-            )
-            for item in quote.itens.all():
-                SalesOrderItem.objects.create(
-                    pedido=order,
-                    produto=item.produto,
-                    descricao=item.descricao,
-                    quantidade=item.quantidade,
-                    preco_unitario=item.preco_unitario,
-                )
-            quote.status = "approved"
-            quote.pedido = order
-            quote.save()
-        messages.success(request, f"Orçamento aprovado e convertido em Pedido #{order.id}.")
-        return redirect("sales:order_detail", pk=order.pk)
+        else:
+            messages.success(request, f"Orçamento aprovado e convertido em Pedido #{res['pedido']}.")
+        return redirect("sales:order_detail", pk=res["pedido"])
 
 # ---- Pedidos ----
-class SalesOrderListView(VendasRequiredMixin, ListView):
+class SalesOrderListView(VendasRequiredMixin, KeysetPaginationMixin, ListView):
     model = SalesOrder
     template_name = "sales/orders_list.html"
     paginate_by = 25
+    keyset_estimate_count = True
 
     def get_queryset(self):
-        return SalesOrder.objects.select_related("cliente").all().order_by("-criado_em")
+        return SalesOrder.objects.select_related("cliente").all()
 
 class SalesOrderDetailView(VendasRequiredMixin, DetailView):
     model = SalesOrder
@@ -1,21 +1,62 @@
-from rest_framework import viewsets, permissions
+from django.db.models import Prefetch
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
-from .models import SalesOrder, SalesOrderItem
-from .serializers import SalesOrderSerializer, SalesOrderItemSerializer
+from .models import SalesOrder, SalesOrderItem, Quote, QuoteItem
+from .serializers import (
+    SalesOrderSerializer, SalesOrderItemSerializer, QuoteSerializer, QuoteApproveSerializer, BatchOrderSerializer,
+    SalesReportQuerySerializer, SalesReportRowSerializer,
+)
 
 class SalesOrderViewSet(viewsets.ModelViewSet):
-    queryset = SalesOrder.objects.select_related("cliente","criado_por").all().order_by("-criado_em")
+    # Itens (com produto) em uma consulta para a página inteira; totais são colunas gravadas
+    queryset = (
+        SalesOrder.objects.select_related("cliente","criado_por")
+        .prefetch_related(Prefetch("itens", queryset=SalesOrderItem.objects.select_related("produto").order_by("id")))
+        .order_by("-criado_em")
+    )
     serializer_class = SalesOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ["status","cliente"]
+    filterset_fields = {"status": ["exact"], "cliente": ["exact"], "total_liquido": ["gte", "lte"]}
     search_fields = ["id","cliente__nome"]
-    ordering_fields = ["criado_em","atualizado_em"]
+    ordering_fields = ["criado_em","atualizado_em","total_liquido"]
 
     def perform_create(self, serializer):
         serializer.save(criado_por=self.request.user)
 
+    @action(detail=False, methods=["post"])
+    def lote(self, request):
+        """Recebe {"pedidos": [{..., "itens": [...]}]} e grava os válidos de uma vez.
+
+        A validação de formato é por pedido: pedidos malformados entram no
+        resultado com seus erros e não impedem os demais.
+        """
+        from .ingestion import ingest_orders
+        pedidos = request.data.get("pedidos") if isinstance(request.data, dict) else None
+        if not isinstance(pedidos, list) or not pedidos:
+            return Response({"pedidos": ["Informe a lista de pedidos."]}, status=status.HTTP_400_BAD_REQUEST)
+        if len(pedidos) > 1000:
+            return Response({"pedidos": ["Máximo de 1000 pedidos por lote."]}, status=status.HTTP_400_BAD_REQUEST)
+        validos, resultados = [], []
+        for data in pedidos:
+            ser = BatchOrderSerializer(data=data)
+            if ser.is_valid():
+                validos.append(ser.validated_data)
+                resultados.append(None)
+            else:
+                ref = data.get("ref", "") if isinstance(data, dict) else ""
+                resultados.append({"ref": ref, "pedido": None, "erros": ser.errors})
+        gravados = iter(ingest_orders(validos, user=request.user))
+        resultados = [r if r is not None else next(gravados) for r in resultados]
+        return Response({
+            "gravados": sum(1 for r in resultados if r["pedido"]),
+            "erros": sum(1 for r in resultados if r["erros"]),
+            "resultados": resultados,
+        })
+
 class SalesOrderItemViewSet(viewsets.ModelViewSet):
     queryset = SalesOrderItem.objects.select_related("pedido","produto").all()
     serializer_class = SalesOrderItemSerializer
@@ -23,3 +64,66 @@ class SalesOrderItemViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ["pedido","produto"]
     ordering_fields = ["id"]
+
+class QuoteViewSet(viewsets.ModelViewSet):
+    queryset = (
+        Quote.objects.select_related("cliente","criado_por")
+        .prefetch_related(Prefetch("itens", queryset=QuoteItem.objects.order_by("id")))
+        .order_by("-criado_em")
+    )
+    serializer_class = QuoteSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = {"status": ["exact"], "cliente": ["exact"], "validade": ["lte", "gte"]}
+    search_fields = ["id","cliente__nome"]
+    ordering_fields = ["criado_em","validade","total_liquido"]
+
+    def perform_create(self, serializer):
+        serializer.save(criado_por=self.request.user)
+
+    def _convert(self, request, ids=None):
+        from .conversion import convert_quotes
+        opts = QuoteApproveSerializer(data=request.data)
+        opts.is_valid(raise_exception=True)
+        params = dict(opts.validated_data)
+        ids = ids or params.pop("ids", None)
+        params.pop("ids", None)
+        if not ids:
+            return None
+        return convert_quotes(ids, user=request.user, **params)
+
+    @action(detail=True, methods=["post"])
+    def aprovar(self, request, pk=None):
+        """Converte o orçamento em pedido (opcionalmente gerando o CR)."""
+        res = self._convert(request, [self.get_object().pk])[0]
+        return Response(res, status=status.HTTP_400_BAD_REQUEST if res["erro"] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"], url_path="aprovar-lote")
+    def aprovar_lote(self, request):
+        """Converte vários orçamentos numa transação: {"ids": [...], "gerar_cr": true, ...}."""
+        resultados = self._convert(request)
+        if resultados is None:
+            return Response({"ids": ["Informe os orçamentos."]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "convertidos": sum(1 for r in resultados if r["criado"]),
+            "erros": sum(1 for r in resultados if r["erro"]),
+            "resultados": resultados,
+        })
+
+class SalesReportViewSet(viewsets.ViewSet):
+    """Relatório de vendas lido do cubo diário (padrão: últimos 12 meses, por produto).
+
+    ?agrupar=produto|cliente|vendedor|dia|mes&inicio=AAAA-MM-DD&fim=...&produto=&cliente=&vendedor=
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        from .cube import sales_report
+        params = SalesReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        p = dict(params.validated_data)
+        rows = sales_report(
+            p.pop("agrupar"), p.pop("inicio", None), p.pop("fim", None),
+            **{f"{k}_id": v for k, v in p.items()},
+        )
+        return Response(SalesReportRowSerializer(rows, many=True).data)